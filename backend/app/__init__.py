@@ -8,6 +8,8 @@ from flask.cli import with_appcontext
 from flask_bcrypt import Bcrypt
 import logging
 
+from app.utils.password_hasher import BCRYPT_LOG_ROUNDS
+
 # Load environment variables
 load_dotenv()
 
@@ -36,6 +38,7 @@ def create_app():
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['BCRYPT_LOG_ROUNDS'] = BCRYPT_LOG_ROUNDS
 
     # Initialize extensions
     db.init_app(app)
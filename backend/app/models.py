@@ -57,11 +57,48 @@ class Alerts(db.Model):
     alert_type = db.Column(SQLAlchemyEnum('water quality', 'meteorological', name='alert_type', create_type=False), nullable=False)
     alert_message = db.Column(db.Text, nullable=False)
     datetime = db.Column(db.DateTime, nullable=False)
+    # Dedupe key: one alert per FLA, parameter and observation date
+    parameter = db.Column(db.String(20))
+    observation_date = db.Column(db.Date)
     status = db.Column(SQLAlchemyEnum('pending', 'dismissed', 'resolved', name='alert_status', create_type=False), nullable=False, default='pending')
     created_at = db.Column(db.DateTime, nullable=False, default=dt.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=False, default=dt.now(timezone.utc), onupdate=dt.now(timezone.utc))
 
+    __table_args__ = (
+        db.Index('uq_alerts_dedupe', 'fla', 'parameter', 'observation_date', unique=True),
+    )
+
     def __init__(self, **kwargs):
         super(Alerts, self).__init__(**kwargs)
         if self.datetime is None:
-            self.datetime = dt.now(timezone.utc)
\ No newline at end of file
+            self.datetime = dt.now(timezone.utc)
+
+class AlertWatermarks(db.Model):
+    __tablename__ = 'AlertWatermarks'
+    fla = db.Column(db.String(20), primary_key=True)
+    parameter = db.Column(db.String(20), primary_key=True)
+    last_scene_time = db.Column(db.DateTime, nullable=False)  # Acquisition time (UTC) of the last processed scene
+    updated_at = db.Column(db.DateTime, nullable=False, default=dt.now(timezone.utc))
+
+class AlertBackfillProgress(db.Model):
+    __tablename__ = 'AlertBackfillProgress'
+    shard_start = db.Column(db.Date, primary_key=True)
+    shard_end = db.Column(db.Date, primary_key=True)  # Exclusive
+    alerts_inserted = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime, nullable=False, default=dt.now(timezone.utc))
+
+class ParameterTimeSeries(db.Model):
+    __tablename__ = 'ParameterTimeSeries'
+    fla = db.Column(db.String(20), primary_key=True)
+    scene_id = db.Column(db.String(64), primary_key=True)  # Sentinel-2 system:index
+    scene_time = db.Column(db.DateTime, nullable=False)  # Acquisition time (UTC)
+    observation_date = db.Column(db.Date, nullable=False)
+    cloud_cover = db.Column(db.Float, nullable=False)  # Scene CLOUDY_PIXEL_PERCENTAGE
+    chlorophyll = db.Column(db.Float)  # Polygon means; NULL where the polygon is masked
+    turbidity = db.Column(db.Float)
+    tss = db.Column(db.Float)
+    ingested_at = db.Column(db.DateTime, nullable=False, default=dt.now(timezone.utc))
+
+    __table_args__ = (
+        db.Index('idx_parameter_time_series_scene_time', 'scene_time', 'cloud_cover'),
+    )
@@ -4,6 +4,8 @@ import jwt
 import datetime
 from app import db
 from app.models import User, Admin
+from app.utils.principal_cache import principal_cache, UserPrincipal, AdminPrincipal
+from app.utils.password_hasher import password_hasher, HashingBusy
 from functools import wraps
 
 print(jwt.__file__)
@@ -17,11 +19,29 @@ bcrypt = Bcrypt()
 # JWT token expiration time
 TOKEN_EXPIRATION = datetime.timedelta(hours=1)
 
+# Password hashing runs on a bounded pool; when its queue is full, ask the client to retry
+@auth_routes.app_errorhandler(HashingBusy)
+def handle_hashing_busy(e):
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# Commits a password hash upgraded during login
+def commit_rehash(subject, old_hash):
+    if subject.password != old_hash:
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
 # Helper function to generate JWT token
 def generate_token(user_id):
+    now = datetime.datetime.now(datetime.timezone.utc)  # Use timezone-aware datetime
     payload = {
         'user_id': user_id,
-        'exp': datetime.datetime.now(datetime.timezone.utc) + TOKEN_EXPIRATION  # Use timezone-aware datetime
+        'iat': now,
+        'exp': now + TOKEN_EXPIRATION
     }
     token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')  # Use SECRET_KEY from Flask config
     return token
@@ -50,16 +70,24 @@ def token_required(f):
             # Handle admin tokens
             if payload.get('is_admin'):
                 admin_id = payload['admin_id']
-                admin = Admin.query.get(admin_id)
-                if not admin:
-                    return jsonify({'error': 'Admin not found'}), 404
+                admin = principal_cache.get('admin', admin_id, payload.get('iat'))
+                if admin is None:
+                    admin = Admin.query.get(admin_id)
+                    if not admin:
+                        return jsonify({'error': 'Admin not found'}), 404
+                    admin = AdminPrincipal(admin)
+                    principal_cache.set('admin', admin_id, payload.get('iat'), admin)
                 return f(admin, *args, **kwargs)
             # Handle user tokens
             else:
                 user_id = payload['user_id']
-                user = User.query.get(user_id)
-                if not user:
-                    return jsonify({'error': 'User not found'}), 404
+                user = principal_cache.get('user', user_id, payload.get('iat'))
+                if user is None:
+                    user = User.query.get(user_id)
+                    if not user:
+                        return jsonify({'error': 'User not found'}), 404
+                    user = UserPrincipal(user)
+                    principal_cache.set('user', user_id, payload.get('iat'), user)
                 return f(user, *args, **kwargs)
                 
         except jwt.ExpiredSignatureError:
@@ -112,7 +140,7 @@ def signup():
         return jsonify({'error': 'Invalid farm affiliation'}), 400
 
     # Hash the password
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = password_hasher.hash(password)
 
     # Create new user
     new_user = User(
@@ -144,11 +172,15 @@ def admin_login():
 
     admin = Admin.query.filter_by(username=username).first()
 
-    if admin and bcrypt.check_password_hash(admin.password, password):
+    old_hash = admin.password if admin else None
+    if admin and password_hasher.check_and_upgrade(admin, password):
+        commit_rehash(admin, old_hash)
+        now = datetime.datetime.now(datetime.timezone.utc)
         payload = {
             'admin_id': admin.admin_id,
             'is_admin': True,
-            'exp': datetime.datetime.now(datetime.timezone.utc) + TOKEN_EXPIRATION
+            'iat': now,
+            'exp': now + TOKEN_EXPIRATION
         }
         token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
         return jsonify({
@@ -170,7 +202,9 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     # Check if the user exists and the password is correct
-    if user and bcrypt.check_password_hash(user.password, password):
+    old_hash = user.password if user else None
+    if user and password_hasher.check_and_upgrade(user, password):
+        commit_rehash(user, old_hash)
         # Check if user is registered and verified
         if not user.is_registered:
             return jsonify({'error': 'Account not yet registered. Please wait for admin approval.'}), 401
@@ -1,17 +1,24 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, send_file
 import os
-import json
+import logging
+from datetime import datetime
 from dotenv import load_dotenv
+from app import db
+from app.utils.time_series_store import get_parameter_series
+from app.utils.threshold_engine import WATER_QUALITY_PARAMETERS
+from app.utils.fla_tiles import get_fla_tile, MVT_MIN_ZOOM, MVT_MAX_ZOOM
+from app.utils.tile_proxy import register_layer, layer_tile_url, get_tile, TileProxyError, TILE_PROXY_MAX_AGE_SECONDS
 
 # Import the updated, asset-specific functions from ee_service
 from app.utils.isdaan_ee_service import (
     get_composite_tiles_for_asset,
     get_specific_date_tiles_for_asset,
+    get_all_parameter_tiles_for_asset,
     get_composite_rgb_tiles_for_asset,
     get_specific_date_rgb_tiles_for_asset,
     get_available_dates_for_asset,
     get_parameter_values_per_polygon,
-    get_asset_details,
+    get_asset_geojson,
     get_composite_rgb_tiles_for_polygons,
     get_specific_date_rgb_tiles_for_polygons
 )
@@ -25,6 +32,10 @@ POLYGON_COORDINATES_JSON = os.getenv("POLYGON_COORDINATES_JSON")
 
 tile_routes = Blueprint("tile_routes", __name__)
 
+def proxied_tile_url(kind: str, **args) -> str:
+    """URL template of the layer behind the tile proxy, for the service call with these arguments."""
+    return layer_tile_url(register_layer(kind, **args), request.host_url)
+
 @tile_routes.route('/get_available_dates', methods=['GET'])
 def get_available_dates_route():
     """
@@ -53,7 +64,10 @@ def get_composite_tile_route():
         return jsonify({"error": "Failed to generate tiles or invalid parameter"}), 400
 
     return jsonify({
-        "tile_url": tile_url,
+        "tile_url": proxied_tile_url(
+            'composite', parameter=parameter, start_date=start_date, end_date=end_date,
+            asset_id=ISDAAN_FLAS_ASSET_ID, cloud_cover=cloud_cover
+        ),
         "legend_min": stretch_params['min'] if stretch_params else None,
         "legend_max": stretch_params['max'] if stretch_params else None
     })
@@ -76,11 +90,48 @@ def get_specific_date_tile_route():
         return jsonify({"error": "No imagery available for the specified date or invalid parameter"}), 404
 
     return jsonify({
-        "tile_url": tile_url,
+        "tile_url": proxied_tile_url(
+            'specific_date', parameter=parameter, date=date, asset_id=ISDAAN_FLAS_ASSET_ID, cloud_cover=cloud_cover
+        ),
         "legend_min": stretch_params['min'] if stretch_params else None,
         "legend_max": stretch_params['max'] if stretch_params else None
     })
 
+@tile_routes.route('/get_all_parameter_tiles', methods=['GET'])
+def get_all_parameter_tiles_route():
+    """
+    Generates tile layers and legends for all water quality parameters at once.
+    Uses the composite over the date range, or a specific date when `date` is given.
+    """
+    start_date = request.args.get('start_date', '2023-01-01')
+    end_date = request.args.get('end_date', '2025-12-31')
+    date = request.args.get('date')
+    cloud_cover = int(request.args.get('cloud_cover', 20))
+
+    if date:
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({"error": "Invalid date, expected YYYY-MM-DD"}), 400
+        # The range doesn't apply to a specific date; keep it out of the cache and layer keys
+        start_date = end_date = None
+
+    layers = get_all_parameter_tiles_for_asset(start_date, end_date, ISDAAN_FLAS_ASSET_ID, cloud_cover, date)
+
+    if not layers:
+        return jsonify({"error": "No imagery available for the specified date or range"}), 404
+
+    return jsonify({
+        parameter: {
+            **layer,
+            "tile_url": proxied_tile_url(
+                'all_parameters', parameter=parameter, start_date=start_date, end_date=end_date,
+                asset_id=ISDAAN_FLAS_ASSET_ID, cloud_cover=cloud_cover, date=date
+            )
+        }
+        for parameter, layer in layers.items()
+    })
+
 @tile_routes.route('/get_composite_rgb_tile', methods=['GET'])
 def get_composite_rgb_tile_route():
     """
@@ -95,7 +146,9 @@ def get_composite_rgb_tile_route():
     if not tile_url:
         return jsonify({"error": "Failed to generate RGB tiles"}), 500
 
-    return jsonify({"tile_url": tile_url})
+    return jsonify({"tile_url": proxied_tile_url(
+        'composite_rgb', start_date=start_date, end_date=end_date, asset_id=ISDAAN_FLAS_ASSET_ID, cloud_cover=cloud_cover
+    )})
 
 @tile_routes.route('/get_specific_date_rgb_tile', methods=['GET'])
 def get_specific_date_rgb_tile_route():
@@ -113,7 +166,9 @@ def get_specific_date_rgb_tile_route():
     if not tile_url:
         return jsonify({"error": "No imagery available for the specified date"}), 404
 
-    return jsonify({"tile_url": tile_url})
+    return jsonify({"tile_url": proxied_tile_url(
+        'specific_date_rgb', date=date, asset_id=ISDAAN_FLAS_ASSET_ID, cloud_cover=cloud_cover
+    )})
 
 @tile_routes.route('/get_composite_rgb_tile_for_polygons', methods=['GET'])
 def get_composite_rgb_tile_for_polygons_route():
@@ -134,7 +189,10 @@ def get_composite_rgb_tile_for_polygons_route():
     if not tile_url:
         return jsonify({"error": "Failed to generate RGB tiles for polygons"}), 500
 
-    return jsonify({"tile_url": tile_url})
+    return jsonify({"tile_url": proxied_tile_url(
+        'composite_rgb_polygons', start_date=start_date, end_date=end_date,
+        coordinates_list=POLYGON_COORDINATES_JSON, cloud_cover=cloud_cover
+    )})
 
 @tile_routes.route('/get_specific_date_rgb_tile_for_polygons', methods=['GET'])
 def get_specific_date_rgb_tile_for_polygons_route():
@@ -156,12 +214,16 @@ def get_specific_date_rgb_tile_for_polygons_route():
     if not tile_url:
         return jsonify({"error": "No imagery available for the specified date"}), 404
 
-    return jsonify({"tile_url": tile_url})
+    return jsonify({"tile_url": proxied_tile_url(
+        'specific_date_rgb_polygons', date=date, coordinates_list=POLYGON_COORDINATES_JSON, cloud_cover=cloud_cover
+    )})
 
 @tile_routes.route('/get_parameter_values', methods=['GET'])
 def get_parameter_values_route():
     """
     Gets time-series data for a parameter, calculated for each polygon in the asset.
+    Values come from the ParameterTimeSeries table; Earth Engine only computes scenes
+    that haven't been ingested yet.
     """
     parameter = request.args.get('parameter', 'chlorophyll')
     start_date = request.args.get('start_date', '2023-01-01')
@@ -169,7 +231,14 @@ def get_parameter_values_route():
     cloud_cover = int(request.args.get('cloud_cover', 20))
 
     try:
-        values = get_parameter_values_per_polygon(parameter, start_date, end_date, ISDAAN_FLAS_ASSET_ID, cloud_cover)
+        values = None
+        if parameter in WATER_QUALITY_PARAMETERS:
+            try:
+                values = get_parameter_series(db.session, parameter, start_date, end_date, ISDAAN_FLAS_ASSET_ID, cloud_cover)
+            except Exception as e:
+                logging.warning(f"Stored time series unavailable, computing with Earth Engine: {e}")
+        if values is None:
+            values = get_parameter_values_per_polygon(parameter, start_date, end_date, ISDAAN_FLAS_ASSET_ID, cloud_cover)
         return jsonify(values)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -178,12 +247,56 @@ def get_parameter_values_route():
 def get_asset_features_route():
     """
     Gets the details of all features in the asset, including properties and geometry.
+    The pre-serialized GeoJSON is sent as-is with a strong ETag; clients that send a
+    matching If-None-Match get a 304 without a body.
     """
     try:
-        # get_asset_details returns a JSON string, so we parse it back to a dict
-        # to let Flask handle the JSO correctly with the right content type.
-        features_json_string = get_asset_details(ISDAAN_FLAS_ASSET_ID)
-        features_dict = json.loads(features_json_string)
-        return jsonify(features_dict)
+        etag, body = get_asset_geojson(ISDAAN_FLAS_ASSET_ID)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers keep the copy but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@tile_routes.route('/fla_tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_fla_tile_route(z, x, y):
+    """
+    Gets a Mapbox Vector Tile (layer 'flas') of the FLA polygons, simplified for the
+    zoom level, with each polygon's properties and its latest alert status.
+    """
+    if not MVT_MIN_ZOOM <= z <= MVT_MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        return jsonify({"error": "Tile out of range"}), 404
+
+    try:
+        etag, body = get_fla_tile(ISDAAN_FLAS_ASSET_ID, z, x, y)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    response = current_app.response_class(body, mimetype='application/vnd.mapbox-vector-tile')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response.make_conditional(request)
+
+@tile_routes.route('/tiles/<layer_key>/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_proxied_tile_route(layer_key, z, x, y):
+    """
+    Serves a tile of a layer handed out by the tile routes. Tiles are fetched from
+    Earth Engine once and then served from the disk cache.
+    """
+    # A disk cache sweep can evict the tile between get_tile() and send_file(); fetch it again once
+    for _ in range(2):
+        try:
+            path = get_tile(layer_key, z, x, y)
+        except TileProxyError as e:
+            return jsonify({"error": str(e)}), e.status_code
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        try:
+            return send_file(path, mimetype='image/png', max_age=TILE_PROXY_MAX_AGE_SECONDS)
+        except FileNotFoundError:
+            logging.info(f"Tile {z}/{x}/{y} of layer {layer_key} was evicted before it was sent")
+    return jsonify({"error": "Tile was evicted from the cache, try again"}), 503
@@ -1,8 +1,10 @@
-from flask import Blueprint, jsonify, request
-import requests
 import os
+import logging
+from flask import Blueprint, jsonify, request
 from dotenv import load_dotenv
 
+from app.utils.weather_client import get_forecast, fetch_forecasts, snap_to_grid, WeatherError
+
 """
 Routes for fetching weather data from OpenWeatherMap API
 """
@@ -13,41 +15,131 @@ load_dotenv()
 
 weather_routes = Blueprint("weather_routes", __name__)
 
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+ISDAAN_FLAS_ASSET_ID = os.getenv("ISDAAN_FLAS_ASSET_ID")
+WEATHER_BATCH_MAX_LOCATIONS = int(os.getenv("WEATHER_BATCH_MAX_LOCATIONS", 500))
+FORECAST_FIELDS = ("temperature", "humidity", "rainfall", "gust_speed")
 
 @weather_routes.route('/get_weather', methods=['GET'])
 def get_weather():
     """Fetch 5-day / 3-hour forecast from OpenWeatherMap."""
-    
+
     lat = request.args.get('lat', "14.0782")
     lon = request.args.get('lon', "121.3301")
-    
-    # Check the OpenWeather API key
-    if not OPENWEATHER_API_KEY:
-        return jsonify({"error": "Missing OpenWeatherMap API key"}), 500
 
-    url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-    
     try:
-        response = requests.get(url)
-        data = response.json()
-        
-        if response.status_code != 200:
-            return jsonify({"error": "Failed to fetch weather data", "details": data}), response.status_code
-        
-        # Extract relevant weather data
-        forecast = []
-        for entry in data["list"]:
-            forecast.append({
-                "datetime": entry["dt_txt"],
-                "temperature": entry["main"]["temp"],  # °C
-                "humidity": entry["main"]["humidity"],  # %
-                "rainfall": entry.get("rain", {}).get("3h", 0),  # mm
-                "gust_speed": entry.get("wind", {}).get("gust", 0)  # m/s
-            })
-        
-        return jsonify({"location": data["city"]["name"], "forecast": forecast})
-    
+        return jsonify(get_forecast(float(lat), float(lon)))
+
+    except ValueError:
+        return jsonify({"error": "Invalid lat/lon"}), 400
+    except WeatherError as e:
+        if e.details is None:
+            return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e), "details": e.details}), e.status_code
+    except Exception as e:
+        return jsonify({"error": "Failed to fetch weather data", "details": str(e)}), 500
+
+
+def _columnar(locations, forecasts):
+    """
+    Builds the batch payload: the union of forecast times once, one entry per grid cell
+    with an array per field aligned with those times (null where a step is missing), and
+    the requested locations as indexes into the cells.
+    """
+    times = sorted({
+        step["datetime"]
+        for forecast in forecasts.values() if not isinstance(forecast, WeatherError)
+        for step in forecast["forecast"]
+    })
+    positions = {t: i for i, t in enumerate(times)}
+
+    cells, cell_index = [], {}
+    for cell, forecast in forecasts.items():
+        cell_index[cell] = len(cells)
+        entry = {"lat": cell[0], "lon": cell[1]}
+        if isinstance(forecast, WeatherError):
+            entry["error"] = str(forecast)
+        else:
+            columns = {field: [None] * len(times) for field in FORECAST_FIELDS}
+            for step in forecast["forecast"]:
+                i = positions[step["datetime"]]
+                for field in FORECAST_FIELDS:
+                    columns[field][i] = step[field]
+            entry.update(location=forecast["location"], **columns)
+        cells.append(entry)
+
+    results = []
+    for location in locations:
+        result = {key: value for key, value in location.items() if key != "cell"}
+        result["cell"] = cell_index[location["cell"]]
+        results.append(result)
+    return {"times": times, "fields": list(FORECAST_FIELDS), "cells": cells, "locations": results}
+
+def _parse_coordinate(pair):
+    """Returns {"lat", "lon"} for a [lat, lon] pair, or None if it isn't a valid one."""
+    if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+        return None
+    if any(isinstance(value, bool) or not isinstance(value, (int, float, str)) for value in pair):
+        return None
+    try:
+        lat, lon = float(pair[0]), float(pair[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return {"lat": lat, "lon": lon}
+
+@weather_routes.route('/get_weather_batch', methods=['POST'])
+def get_weather_batch():
+    """
+    Fetch the forecast for many locations in one request.
+    Body: {"coordinates": [[lat, lon], ...], "flas": ["FLA name", ...]} (either or both).
+    Locations are deduplicated to weather grid cells and each cell is fetched once.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    coordinates = data.get("coordinates") or []
+    fla_names = data.get("flas") or []
+
+    if not isinstance(coordinates, list):
+        return jsonify({"error": "Invalid coordinates, expected [[lat, lon], ...]"}), 400
+    if not isinstance(fla_names, list):
+        return jsonify({"error": "Invalid flas, expected [\"FLA name\", ...]"}), 400
+    if not coordinates and not fla_names:
+        return jsonify({"error": "Provide 'coordinates' and/or 'flas'"}), 400
+    if len(coordinates) + len(fla_names) > WEATHER_BATCH_MAX_LOCATIONS:
+        return jsonify({"error": f"At most {WEATHER_BATCH_MAX_LOCATIONS} locations per request"}), 400
+
+    locations = []
+    for pair in coordinates:
+        location = _parse_coordinate(pair)
+        if location is None:
+            return jsonify({"error": "Invalid coordinates, expected [[lat, lon], ...]", "details": pair}), 400
+        locations.append(location)
+
+    if fla_names:
+        try:
+            from app.utils.isdaan_ee_service import get_polygon_centroids
+            centroids = {str(name): (lat, lon) for name, lon, lat in get_polygon_centroids(ISDAAN_FLAS_ASSET_ID)}
+        except Exception as e:
+            logging.error(f"Could not load FLA centroids: {e}")
+            return jsonify({"error": "Failed to resolve FLA locations", "details": str(e)}), 500
+        unknown = [name for name in fla_names if str(name) not in centroids]
+        if unknown:
+            return jsonify({"error": "Unknown FLA(s)", "details": unknown}), 404
+        for name in fla_names:
+            lat, lon = centroids[str(name)]
+            locations.append({"fla": str(name), "lat": lat, "lon": lon})
+
+    for location in locations:
+        location["cell"] = snap_to_grid(location["lat"], location["lon"])
+
+    try:
+        forecasts = fetch_forecasts(location["cell"] for location in locations)
     except Exception as e:
         return jsonify({"error": "Failed to fetch weather data", "details": str(e)}), 500
 
+    payload = _columnar(locations, forecasts)
+    if all("error" in cell for cell in payload["cells"]):
+        return jsonify({"error": "Failed to fetch weather data", "details": payload["cells"][0]["error"]}), 502
+    return jsonify(payload)
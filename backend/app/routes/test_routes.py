@@ -1,11 +1,15 @@
 from flask import Blueprint, jsonify
 from app import db
 from sqlalchemy import text
+from app.utils.ee_session import ee_session
+from app.utils.password_hasher import password_hasher
+from app.routes.auth_routes import token_required
 
 test_routes = Blueprint('test_routes', __name__)
 
 """
-Routes for checking the connection of the backend to the database
+Routes for checking the connection of the backend to the database and Earth Engine,
+and for worker pool metrics
 """
 
 @test_routes.route('/api/test-db', methods=['GET'])
@@ -14,4 +18,16 @@ def test_db():
         db.session.execute(text('SELECT 1'))
         return jsonify({'message': 'Database connection successful'}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@test_routes.route('/api/test-ee', methods=['GET'])
+def test_ee():
+    health = ee_session.health_check()
+    return jsonify(health), 200 if health['status'] == 'ok' else 503
+
+@test_routes.route('/api/metrics/hashing', methods=['GET'])
+@token_required
+def hashing_metrics(user_or_admin):
+    if not getattr(user_or_admin, 'is_admin', False):
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(password_hasher.metrics()), 200
@@ -1,57 +1,144 @@
 from flask import Blueprint, jsonify, request
 from app.models import User, FishFarm
 from app import db
-from app.routes.auth_routes import bcrypt 
-from sqlalchemy import or_
+from app.utils.password_hasher import password_hasher, HashingBusy
+from app.utils.principal_cache import principal_cache
+from sqlalchemy import or_, tuple_, inspect, func, cast, Float
+import base64
+import datetime
+import json
 
 user_routes = Blueprint('user_routes', __name__)
 
+"""
+User listings use keyset (cursor) pagination: each page is fetched with a
+WHERE (sort key) > (last key of the previous page) ... LIMIT n query, so deep pages cost
+the same as the first one and no COUNT(*) is needed. Farm names are resolved with an
+outer join on the same query instead of one lookup per user.
+"""
+
+MAX_PER_PAGE = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+def _encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.datetime.fromisoformat(v) if column is User.created_at else v
+            for column, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+
+def _users_with_farms():
+    """Users joined with their farm's name (None without an affiliation)."""
+    farm_id = inspect(FishFarm).primary_key[0]
+    return db.session.query(User, FishFarm.farm_name).outerjoin(FishFarm, farm_id == User.farm_affiliation)
+
+def _keyset_page(query, columns, descending=False, key_of=None):
+    """
+    Applies the sort key, the cursor from ?cursor= and ?per_page= to the query.
+    key_of(row) returns the sort key values of a row; by default they are read from
+    the row's User. Returns (rows, per_page, next_cursor); next_cursor is None on the
+    last page.
+    """
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+    cursor = request.args.get('cursor')
+
+    if cursor:
+        values = _decode_cursor(cursor, columns)
+        # Row-value comparison (a, b) > (x, y), which PostgreSQL answers with one index range scan
+        key, last = tuple_(*columns), tuple_(*values)
+        query = query.filter(key < last if descending else key > last)
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        if key_of is None:
+            key_of = lambda row: [getattr(row[0], column.key) for column in columns]
+        next_cursor = _encode_cursor(key_of(rows[-1]))
+    return rows, per_page, next_cursor
+
+def _user_to_dict(user, farm_name):
+    return {
+        "user_id": user.user_id,
+        "name": user.name,
+        "email": user.email,
+        "contact_no": user.contact_no,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "is_registered": user.is_registered,
+        "is_verified": user.is_verified,
+        "farm_affiliation": farm_name
+    }
+
+def _search_page(query, search_term, columns, descending=False):
+    """
+    Returns a keyset page of the users matching the search term, best match first.
+    The term is matched as a case-insensitive substring of name, email or contact_no,
+    which PostgreSQL answers from the pg_trgm GIN indexes. Matches are ranked by their
+    best trigram similarity. Without a term, the listing's usual order is used.
+    """
+    if not search_term:
+        return _keyset_page(query, columns, descending)
+
+    # Backslash is PostgreSQL's default LIKE escape character
+    escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    search_pattern = f"%{escaped}%"
+    # similarity() returns real; compare and page on float8 so the value stored in the
+    # cursor round-trips exactly and rows tied with the last one aren't skipped
+    score = cast(func.greatest(
+        func.similarity(User.name, search_term),
+        func.similarity(User.email, search_term),
+        func.similarity(User.contact_no, search_term)
+    ), Float)
+    query = query.add_columns(score.label('score')).filter(
+        or_(
+            User.name.ilike(search_pattern),
+            User.email.ilike(search_pattern),
+            User.contact_no.ilike(search_pattern)
+        )
+    )
+    return _keyset_page(
+        query, [score, User.user_id], descending=True,
+        key_of=lambda row: [row.score, row[0].user_id]
+    )
+
+def _page_response(rows, per_page, next_cursor):
+    return jsonify({
+        "users": [_user_to_dict(row[0], row[1]) for row in rows],
+        "per_page": per_page,
+        "next_cursor": next_cursor
+    }), 200
+
+def _registered(query):
+    return query.filter((User.is_registered == True) & (User.is_verified == True))
+
+def _pending(query):
+    return query.filter((User.is_registered == False) | (User.is_verified == False))
+
 # Retrieve all registered and verified users
 @user_routes.route('/api/retrieve-registered-users', methods=['GET'])
 def retrieve_registered_users():
     """
-    Retrieve a list of all registered and verified users.
+    Retrieve a list of all registered and verified users, ordered by name.
+    Pass the returned next_cursor as ?cursor= to get the next page.
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Fetch all users that are registered and verified by the admin from the database
-        registered_users = User.query.filter(
-            (User.is_registered == True) & (User.is_verified == True)
-        )
-        
-        # Paginate the results
-        paginated_users = registered_users.paginate(page=page, per_page=per_page, error_out=False)
-        
-        # Convert the list of User objects to a list of dictionaries
-        users_list = []
-        for user in paginated_users.items:
-            user_data = {
-                "user_id": user.user_id,
-                "name": user.name,
-                "email": user.email,
-                "contact_no": user.contact_no,
-                "created_at": user.created_at,
-                "is_registered": user.is_registered,
-                "is_verified": user.is_verified,
-                "farm_affiliation": None
-            }
-            
-            if user.farm_affiliation:
-                farm = FishFarm.query.get(user.farm_affiliation)
-                if farm:
-                    user_data["farm_affiliation"] = farm.farm_name
-            
-            users_list.append(user_data)
-        
-        # Return the list of registered users and pagination as response
-        return jsonify({
-            "users": users_list,
-            "total_count": paginated_users.total,
-            "page": paginated_users.page,
-            "per_page": paginated_users.per_page
-        }), 200
+        rows, per_page, next_cursor = _keyset_page(_registered(_users_with_farms()), [User.name, User.user_id])
+        return _page_response(rows, per_page, next_cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Failed to retrieve registered users", "details": str(e)}), 500
 
@@ -103,7 +190,7 @@ def update_user(user_id):
         # Handle password update with proper hashing
         password = data.get('password')
         if password:
-            hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+            hashed_password = password_hasher.hash(password)
             user.password = hashed_password
         
         user.is_registered = data.get('is_registered', user.is_registered)
@@ -111,6 +198,8 @@ def update_user(user_id):
         user.farm_affiliation = data.get('farm_affiliation', user.farm_affiliation)
         
         db.session.commit()
+        # Flags, password or profile may have changed; drop the cached principal
+        principal_cache.invalidate('user', user_id)
         return jsonify({
             "user_id": user.user_id,
             "name": user.name,
@@ -120,6 +209,9 @@ def update_user(user_id):
             "is_verified": user.is_verified,
             "farm_affiliation": user.farm_affiliation
         }), 200
+    except HashingBusy:
+        db.session.rollback()
+        raise # Answered with 429 by the auth blueprint's handler
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to update user", "details": str(e)}), 500
@@ -137,6 +229,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        principal_cache.invalidate('user', user_id)
         return jsonify({"message": "User deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -144,113 +237,35 @@ def delete_user(user_id):
     
 @user_routes.route('/api/retrieve-pending-registrations', methods=['GET'])
 def retrieve_pending_registrations():
+    """
+    Retrieve users who are not registered or not verified, newest first.
+    Pass the returned next_cursor as ?cursor= to get the next page.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Query for users who are not registered or not verified
-        query = User.query.filter(
-            (User.is_registered == False) | (User.is_verified == False)
+        rows, per_page, next_cursor = _keyset_page(
+            _pending(_users_with_farms()), [User.created_at, User.user_id], descending=True
         )
-        
-        # Paginate the results
-        paginated_users = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        # Get farm names for each user
-        users_with_farms = []
-        for user in paginated_users.items:
-            user_data = {
-                "user_id": user.user_id,
-                "name": user.name,
-                "email": user.email,
-                "contact_no": user.contact_no,
-                "created_at": user.created_at,
-                "is_registered": user.is_registered,
-                "is_verified": user.is_verified,
-                "farm_affiliation": None
-            }
-            
-            if user.farm_affiliation:
-                farm = FishFarm.query.get(user.farm_affiliation)
-                if farm:
-                    user_data["farm_affiliation"] = farm.farm_name
-            
-            users_with_farms.append(user_data)
-        
-        return jsonify({
-            "users": users_with_farms,
-            "total_count": paginated_users.total,
-            "page": paginated_users.page,
-            "per_page": paginated_users.per_page
-        }), 200
-        
+        return _page_response(rows, per_page, next_cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Failed to retrieve pending registrations", "details": str(e)}), 500
     
 @user_routes.route('/api/search-registered-users', methods=['GET'])
 def search_registered_users():
     """
-    Retrieve a paginated list of registered and verified users filtered by a search term.
-    The search term filters by user name or email (case-insensitive).
+    Retrieve a cursor-paginated list of registered and verified users filtered by a search term.
+    The search term filters by user name, email or contact number (case-insensitive),
+    ranked by similarity.
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         search_term = request.args.get('search_term', '', type=str)
-
-        # Base query for registered and verified users
-        query = User.query.filter(
-            User.is_registered == True,
-            User.is_verified == True
+        rows, per_page, next_cursor = _search_page(
+            _registered(_users_with_farms()), search_term, [User.name, User.user_id]
         )
-
-        # Apply search filter if search_term is provided
-        if search_term:
-            search_pattern = f"%{search_term}%"
-            query = query.filter(
-                or_(
-                    User.name.ilike(search_pattern),
-                    User.email.ilike(search_pattern)
-                    # Add other fields to search here if needed, e.g., contact_no
-                    # User.contact_no.ilike(search_pattern)
-                )
-            )
-
-        # Add ordering
-        query = query.order_by(User.name) # Or User.created_at, etc.
-
-        # Paginate the results
-        paginated_users = query.paginate(page=page, per_page=per_page, error_out=False)
-
-        # Convert the list of User objects to a list of dictionaries
-        users_list = []
-        for user in paginated_users.items:
-            user_data = {
-                "user_id": user.user_id,
-                "name": user.name,
-                "email": user.email,
-                "contact_no": user.contact_no,
-                "created_at": user.created_at.isoformat(), # Use isoformat for consistency
-                "is_registered": user.is_registered,
-                "is_verified": user.is_verified,
-                "farm_affiliation": None
-            }
-
-            # Fetch farm name if affiliation exists
-            if user.farm_affiliation:
-                farm = FishFarm.query.get(user.farm_affiliation)
-                if farm:
-                    user_data["farm_affiliation"] = farm.farm_name
-
-            users_list.append(user_data)
-
-        # Return the list of registered users and pagination as response
-        return jsonify({
-            "users": users_list,
-            "total_count": paginated_users.total,
-            "page": paginated_users.page,
-            "per_page": paginated_users.per_page
-        }), 200
+        return _page_response(rows, per_page, next_cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         # Consider logging the error e
         return jsonify({"error": "Failed to search registered users", "details": str(e)}), 500
@@ -259,69 +274,19 @@ def search_registered_users():
 @user_routes.route('/api/search-pending-users', methods=['GET'])
 def search_pending_users():
     """
-    Retrieve a paginated list of pending (unregistered or unverified) users
+    Retrieve a cursor-paginated list of pending (unregistered or unverified) users
     filtered by a search term.
-    The search term filters by user name or email (case-insensitive).
+    The search term filters by user name, email or contact number (case-insensitive),
+    ranked by similarity; without a term the newest come first.
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         search_term = request.args.get('search_term', '', type=str)
-
-        # Base query for pending users (not registered OR not verified)
-        query = User.query.filter(
-            or_(
-                User.is_registered == False,
-                User.is_verified == False
-            )
+        rows, per_page, next_cursor = _search_page(
+            _pending(_users_with_farms()), search_term, [User.created_at, User.user_id], descending=True
         )
-
-        # Apply search filter if search_term is provided
-        if search_term:
-            search_pattern = f"%{search_term}%"
-            query = query.filter(
-                or_(
-                    User.name.ilike(search_pattern),
-                    User.email.ilike(search_pattern)
-                    # Add other fields to search here if needed
-                )
-            )
-
-        # Add ordering
-        query = query.order_by(User.created_at.desc()) # Show newest pending first
-
-        # Paginate the results
-        paginated_users = query.paginate(page=page, per_page=per_page, error_out=False)
-
-        # Convert the list of User objects to a list of dictionaries
-        users_list = []
-        for user in paginated_users.items:
-            user_data = {
-                "user_id": user.user_id,
-                "name": user.name,
-                "email": user.email,
-                "contact_no": user.contact_no,
-                "created_at": user.created_at.isoformat(), # Use isoformat
-                "is_registered": user.is_registered,
-                "is_verified": user.is_verified,
-                "farm_affiliation": None
-            }
-
-            # Fetch farm name if affiliation exists
-            if user.farm_affiliation:
-                farm = FishFarm.query.get(user.farm_affiliation)
-                if farm:
-                    user_data["farm_affiliation"] = farm.farm_name
-
-            users_list.append(user_data)
-
-        # Return the list of pending users and pagination as response
-        return jsonify({
-            "users": users_list,
-            "total_count": paginated_users.total,
-            "page": paginated_users.page,
-            "per_page": paginated_users.per_page
-        }), 200
+        return _page_response(rows, per_page, next_cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         # Consider logging the error e
-        return jsonify({"error": "Failed to search pending users", "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to search pending users", "details": str(e)}), 500
@@ -0,0 +1,100 @@
+"""
+Bulk persistence of generated alerts and of the alert job's scene watermarks.
+
+Alerts are deduplicated on (fla, parameter, observation_date) by the uq_alerts_dedupe
+unique index, so a run writes all of its alerts with a single
+INSERT ... ON CONFLICT DO NOTHING instead of checking for each alert first.
+"""
+
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import Alerts, AlertWatermarks, AlertBackfillProgress
+
+def build_alert_row(fla: str, parameter: str, observation_date, message: str, alert_type: str = 'water quality') -> dict:
+    """Builds an Alerts row for a breach observed on observation_date."""
+    now = datetime.now(timezone.utc)
+    return {
+        'fla': fla,
+        'parameter': parameter,
+        'observation_date': observation_date,
+        'alert_type': alert_type,
+        'alert_message': message,
+        'datetime': datetime.combine(observation_date, datetime.min.time()),
+        'status': 'pending',
+        'created_at': now,
+        'updated_at': now,
+    }
+
+def insert_alerts(db_session, rows: list) -> int:
+    """
+    Inserts alert rows in one statement, skipping any that already exist.
+    Returns the number of alerts actually inserted. The caller commits.
+    """
+    if not rows:
+        return 0
+
+    # Collapse duplicates within the batch; ON CONFLICT can't touch the same row twice
+    unique_rows = list({(row['fla'], row['parameter'], row['observation_date']): row for row in rows}.values())
+
+    stmt = pg_insert(Alerts.__table__).values(unique_rows).on_conflict_do_nothing(
+        index_elements=['fla', 'parameter', 'observation_date']
+    )
+    result = db_session.execute(stmt)
+    inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(unique_rows)
+    logging.info(f"Inserted {inserted} new alert(s), {len(unique_rows) - inserted} already existed")
+    return inserted
+
+def ms_to_utc(ms: int) -> datetime:
+    """Converts epoch milliseconds to a naive UTC datetime (as stored in TIMESTAMP columns)."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).replace(tzinfo=None)
+
+def utc_to_ms(value: datetime) -> int:
+    """Converts a naive UTC datetime to epoch milliseconds."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def load_watermarks(db_session) -> dict:
+    """Returns {(fla, parameter): last processed scene time in epoch ms}."""
+    rows = db_session.query(AlertWatermarks.fla, AlertWatermarks.parameter, AlertWatermarks.last_scene_time).all()
+    return {(fla, parameter): utc_to_ms(last_scene_time) for fla, parameter, last_scene_time in rows}
+
+def advance_watermarks(db_session, watermarks: dict) -> None:
+    """
+    Upserts {(fla, parameter): scene time in epoch ms} in one statement. Watermarks never
+    move backwards. The caller commits, together with the alerts of the same run.
+    """
+    if not watermarks:
+        return
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {'fla': fla, 'parameter': parameter, 'last_scene_time': ms_to_utc(ms), 'updated_at': now}
+        for (fla, parameter), ms in watermarks.items()
+    ]
+    stmt = pg_insert(AlertWatermarks.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['fla', 'parameter'],
+        set_={
+            'last_scene_time': func.greatest(AlertWatermarks.__table__.c.last_scene_time, stmt.excluded.last_scene_time),
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    db_session.execute(stmt)
+
+def completed_backfill_shards(db_session) -> set:
+    """Returns the (shard_start, shard_end) dates of every completed backfill shard."""
+    return set(db_session.query(AlertBackfillProgress.shard_start, AlertBackfillProgress.shard_end).all())
+
+def record_backfill_shard(db_session, shard_start, shard_end, alerts_inserted: int) -> None:
+    """Marks a backfill shard as completed. The caller commits, together with the shard's alerts."""
+    stmt = pg_insert(AlertBackfillProgress.__table__).values(
+        shard_start=shard_start, shard_end=shard_end,
+        alerts_inserted=alerts_inserted, completed_at=datetime.now(timezone.utc)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['shard_start', 'shard_end'],
+        set_={'alerts_inserted': stmt.excluded.alerts_inserted, 'completed_at': stmt.excluded.completed_at}
+    )
+    db_session.execute(stmt)
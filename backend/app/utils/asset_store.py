@@ -0,0 +1,86 @@
+"""
+Versioned local store for values derived from Earth Engine assets.
+
+Values (e.g. the dissolved ROI geometry) are computed once per asset version, where
+the version is the asset's update time, and kept in memory and on disk so that worker
+restarts and other processes on the host reuse them. Older versions are removed when
+a new one is written.
+"""
+
+import os
+import re
+import glob
+import hashlib
+import logging
+import threading
+
+from app.config import Config
+from app.utils.single_flight import SingleFlight
+
+class VersionedAssetStore:
+    """Memory + disk store of one derived value per (asset_id, version)."""
+
+    def __init__(self, name: str, encode, decode, suffix: str = '.json'):
+        self.name = name
+        self.directory = os.path.join(Config.CACHE_DIR, name)
+        self.encode = encode  # value -> bytes
+        self.decode = decode  # bytes -> value
+        self.suffix = suffix
+        self._memory = {}  # asset_id -> (version, value)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _safe_id(self, asset_id: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', asset_id)
+
+    def _path(self, asset_id: str, version: str) -> str:
+        digest = hashlib.sha1(version.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.directory, f"{self._safe_id(asset_id)}-{digest}{self.suffix}")
+
+    def peek(self, asset_id: str):
+        """Returns the (version, value) currently held in memory, if any."""
+        with self._lock:
+            return self._memory.get(asset_id)
+
+    def get(self, asset_id: str, version: str, build):
+        """Returns the value for this asset version, building and persisting it if missing."""
+        with self._lock:
+            entry = self._memory.get(asset_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return self._flight.do(f"{asset_id}:{version}", self._load_or_build, asset_id, version, build)
+
+    def _load_or_build(self, asset_id: str, version: str, build):
+        path = self._path(asset_id, version)
+        value = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    value = self.decode(f.read())
+                logging.info(f"Loaded {self.name} for {asset_id} from disk")
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable {self.name} file {path}: {e}")
+                value = None
+
+        if value is None:
+            logging.info(f"Building {self.name} for {asset_id} (version {version})")
+            value = build()
+            self._write(asset_id, path, value)
+
+        with self._lock:
+            self._memory[asset_id] = (version, value)
+        return value
+
+    def _write(self, asset_id: str, path: str, value):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(self.encode(value))
+            os.replace(tmp_path, path)
+            # Drop files of previous versions of this asset
+            for old_path in glob.glob(os.path.join(self.directory, f"{glob.escape(self._safe_id(asset_id))}-{'?' * 12}{self.suffix}")):
+                if old_path != path:
+                    os.remove(old_path)
+        except OSError as e:
+            logging.warning(f"Could not persist {self.name} for {asset_id}: {e}")
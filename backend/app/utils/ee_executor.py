@@ -0,0 +1,100 @@
+"""
+Shared, bounded executor for blocking Earth Engine calls (getInfo, getMapId).
+
+Independent round trips are submitted here so they overlap instead of running one
+after another on the request thread. The pool size caps how many EE requests a
+process has in flight at once, which keeps bursts within the EE quota.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+EE_MAX_CONCURRENCY = int(os.getenv('EE_MAX_CONCURRENCY', 8))
+EE_CALL_TIMEOUT_SECONDS = float(os.getenv('EE_CALL_TIMEOUT_SECONDS', 120))
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_state = threading.local()
+
+def _mark_worker_thread():
+    _worker_state.is_worker = True
+
+def get_ee_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide EE executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=EE_MAX_CONCURRENCY,
+                    thread_name_prefix='ee-worker',
+                    initializer=_mark_worker_thread
+                )
+    return _executor
+
+def _reset_after_fork():
+    # Worker threads don't survive a fork; the child builds its own pool on first use
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def submit_ee(func, *args, **kwargs) -> Future:
+    """
+    Schedules func(*args, **kwargs) on the EE executor and returns its Future.
+    Calls made from an executor thread run inline, so nested fan-outs can't
+    exhaust the pool and deadlock.
+    """
+    if getattr(_worker_state, 'is_worker', False):
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+    return get_ee_executor().submit(func, *args, **kwargs)
+
+def gather(futures, timeout: float = EE_CALL_TIMEOUT_SECONDS, return_exceptions: bool = False) -> list:
+    """
+    Waits for the futures and returns their results in order.
+    Each call gets `timeout` seconds from the moment gathering starts; a call that
+    doesn't finish in time raises TimeoutError. With return_exceptions=True, errors
+    (including timeouts) are returned in place of results instead of being raised.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    results = []
+    for future in futures:
+        try:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            results.append(future.result(timeout=remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            error = TimeoutError(f"Earth Engine call did not finish within {timeout} seconds")
+            if not return_exceptions:
+                raise error
+            logging.warning(str(error))
+            results.append(error)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+def fan_out(func, calls, timeout: float = EE_CALL_TIMEOUT_SECONDS, return_exceptions: bool = False) -> list:
+    """
+    Runs func once per entry of `calls` on the EE executor and gathers the results.
+    Each entry is a tuple of positional arguments or a dict of keyword arguments.
+    """
+    futures = [
+        submit_ee(func, **call) if isinstance(call, dict) else submit_ee(func, *call)
+        for call in calls
+    ]
+    return gather(futures, timeout=timeout, return_exceptions=return_exceptions)
@@ -1,82 +1,18 @@
 import ee
 import os
 import json
-import threading
+import time
 import datetime
 import logging
 from dotenv import load_dotenv
 from functools import lru_cache
 
+from app.utils.ee_session import ensure_ee_initialized
+from app.utils.scene_index import SceneIndex, ms_to_date
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
-# --- GEE Initialization Handling ---
-_ee_initialized = threading.local() # Thread-local storage for initialization status
-def initialize_ee():
-    """
-    Initializes the Earth Engine library using service account credentials. 
-    Ensures initialization happens only once per thread/context.
-    """
-    # Check if already initialized in the current thread/context
-    if getattr(_ee_initialized, 'status', False):
-        return
-
-    logging.info("Attempting to initialize Earth Engine...")
-    try:
-        project_id = os.getenv('EE_PROJECT_ID')
-        credential_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-        service_account = os.getenv('EE_SERVICE_ACCOUNT')
-
-        if not project_id:
-            # Log a warning but proceed, GEE might infer project from credentials
-            logging.warning("EE_PROJECT_ID environment variable not set. GEE will attempt to infer project from credentials.")
-        
-        if not service_account:
-            # Log a warning but proceed, GEE might infer project from credentials
-            logging.warning("EE_SERVICE_ACCOUNT environment variable not set. GEE will attempt to infer project from credentials.")
-
-        if not credential_path:
-            # This is usually critical for service account auth
-            raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set. Please point it to your service account key file.")
-        elif not os.path.exists(credential_path):
-             raise FileNotFoundError(f"Service account key file not found at path specified by GOOGLE_APPLICATION_CREDENTIALS: {credential_path}")
-        
-        credentials=ee.ServiceAccountCredentials(service_account, credential_path)
-
-        ee.Initialize(project=project_id, credentials=credentials, opt_url='https://earthengine-highvolume.googleapis.com')
-
-        logging.info(f"Earth Engine Initialized Successfully for project: {project_id or 'inferred'}")
-        _ee_initialized.status = True # Mark as initialized for this thread
-
-    except ee.EEException as eee: # Catch specific GEE init errors
-        logging.error(f"GEE Initialization Error: {eee}")
-        _ee_initialized.status = False
-        raise RuntimeError(f"Failed to initialize GEE: {eee}")
-    except Exception as e:
-        logging.exception("FATAL: Earth Engine Initialization Failed!") # Log full traceback
-        _ee_initialized.status = False
-        # Re-raise the original error for clarity
-        raise
-
-def ensure_ee_initialized(func):
-    """Decorator to ensure Earth Engine is initialized before calling the function."""
-    def wrapper(*args, **kwargs):
-        initialize_ee() # Check and initialize if needed for this thread/context
-        if not getattr(_ee_initialized, 'status', False):
-             # Handle case where initialization failed previously in this context
-             raise RuntimeError("Earth Engine is not initialized or initialization failed.")
-        try:
-            return func(*args, **kwargs)
-        except ee.EEException as e:
-            logging.error(f"Earth Engine API error in {func.__name__}: {e}")
-            # Consider returning a default value (like None or []) or raising a custom app error
-            raise RuntimeError(f"An Earth Engine error occurred: {e}")
-        except Exception as e:
-            logging.exception(f"Unexpected error in GEE function {func.__name__}")
-            raise # Re-raise other unexpected errors
-    return wrapper
-
-
 @lru_cache(maxsize=None) # Cache the result so the Geometry isn't recreated unnecessarily
 @ensure_ee_initialized # Ensures EE is initialized before creating the geometry
 def get_roi():
@@ -212,9 +148,29 @@ def filter_collection(start_date, end_date, cloud_cover=20):
         .filterDate(start_date, end_date) \
         .filterMetadata('CLOUDY_PIXEL_PERCENTAGE', 'less_than', cloud_cover)
 
+@ensure_ee_initialized
+def _fetch_scenes_since(since_ms):
+    """Returns [time_ms, scene_id, cloud_percentage] for every scene over the ROI since since_ms."""
+    collection = ee.ImageCollection('COPERNICUS/S2_HARMONIZED') \
+        .filterBounds(get_roi()) \
+        .filterDate(ee.Date(since_ms), ee.Date(int(time.time() * 1000)))
+    return collection.reduceColumns(
+        ee.Reducer.toList(3), ['system:time_start', 'system:index', 'CLOUDY_PIXEL_PERCENTAGE']
+    ).get('list').getInfo()
+
+_scene_index = SceneIndex('legacy-roi')
+
 @ensure_ee_initialized
 def get_dates(start_date, end_date, cloud_cover=20):
     """Fetch available dates for Sentinel-2 imagery within the given range."""
+    try:
+        # The legacy ROI is fixed, so the index never needs a rebuild
+        _scene_index.refresh('static', _fetch_scenes_since)
+        if _scene_index.covers(start_date):
+            return [ms_to_date(t) for t, _, _ in _scene_index.query(start_date, end_date, cloud_cover)]
+    except Exception as e:
+        logging.warning(f"Scene index unavailable, querying Earth Engine: {e}")
+
     collection = filter_collection(start_date, end_date, cloud_cover)
     try:
         available_dates = collection.aggregate_array('system:time_start').getInfo()
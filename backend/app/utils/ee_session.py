@@ -0,0 +1,156 @@
+"""
+Process-wide Earth Engine session.
+
+Earth Engine is initialized once per process (lazily, under a lock) instead of once
+per thread. The session re-initializes automatically in a forked child and after
+authentication errors (e.g. expired or rotated credentials). `warm_up()` loads the
+service account credentials ahead of time, so a gunicorn master can do it before
+forking workers.
+"""
+
+import ee
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EE_HIGH_VOLUME_URL = 'https://earthengine-highvolume.googleapis.com'
+_AUTH_ERROR_MARKERS = ('401', 'unauthenticated', 'unauthorized', 'invalid_grant', 'credentials', 'access token')
+
+def _is_auth_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _AUTH_ERROR_MARKERS)
+
+
+class EESession:
+    """Lock-guarded, lazily initialized Earth Engine session shared by all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._initialized_pid = None
+        self.initialized_at = None
+
+    @property
+    def is_initialized(self) -> bool:
+        # A forked child inherits the flag but not a usable connection
+        return self._initialized_pid == os.getpid()
+
+    def _load_credentials(self):
+        project_id = os.getenv('EE_PROJECT_ID')
+        credential_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        service_account = os.getenv('EE_SERVICE_ACCOUNT')
+
+        if not project_id:
+            # Log a warning but proceed, GEE might infer project from credentials
+            logging.warning("EE_PROJECT_ID environment variable not set. GEE will attempt to infer project from credentials.")
+
+        if not service_account:
+            # Log a warning but proceed, GEE might infer project from credentials
+            logging.warning("EE_SERVICE_ACCOUNT environment variable not set. GEE will attempt to infer project from credentials.")
+
+        if not credential_path:
+            # This is usually critical for service account auth
+            raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set. Please point it to your service account key file.")
+        elif not os.path.exists(credential_path):
+            raise FileNotFoundError(f"Service account key file not found at path specified by GOOGLE_APPLICATION_CREDENTIALS: {credential_path}")
+
+        return ee.ServiceAccountCredentials(service_account, credential_path)
+
+    def warm_up(self):
+        """Loads the service account credentials without opening any connection (safe before fork)."""
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._load_credentials()
+                logging.info("Earth Engine credentials loaded")
+
+    def initialize(self, force: bool = False):
+        """Initializes Earth Engine once per process; `force` re-reads credentials and re-initializes."""
+        if self.is_initialized and not force:
+            return
+
+        with self._lock:
+            if self.is_initialized and not force:
+                return
+
+            logging.info("Attempting to initialize Earth Engine...")
+            try:
+                if force or self._credentials is None:
+                    self._credentials = self._load_credentials()
+                project_id = os.getenv('EE_PROJECT_ID')
+
+                ee.Initialize(project=project_id, credentials=self._credentials, opt_url=EE_HIGH_VOLUME_URL)
+
+                self._initialized_pid = os.getpid()
+                self.initialized_at = time.time()
+                logging.info(f"Earth Engine Initialized Successfully for project: {project_id or 'inferred'}")
+
+            except ee.EEException as eee: # Catch specific GEE init errors
+                logging.error(f"GEE Initialization Error: {eee}")
+                self._initialized_pid = None
+                raise RuntimeError(f"Failed to initialize GEE: {eee}")
+            except Exception:
+                logging.exception("FATAL: Earth Engine Initialization Failed!") # Log full traceback
+                self._initialized_pid = None
+                raise
+
+    def call(self, func, *args, **kwargs):
+        """Runs func, re-authenticating and retrying once if EE rejects the credentials."""
+        started = time.time()
+        try:
+            return func(*args, **kwargs)
+        except ee.EEException as e:
+            if not _is_auth_error(e):
+                raise
+            # Another thread may already have re-initialized after the same failure
+            if self.initialized_at is None or self.initialized_at <= started:
+                logging.warning(f"Earth Engine authentication error ({e}). Re-initializing session and retrying.")
+                self.initialize(force=True)
+            return func(*args, **kwargs)
+
+    def health_check(self) -> dict:
+        """Runs a trivial server-side computation and reports the session status and latency."""
+        started = time.monotonic()
+        try:
+            self.initialize()
+            self.call(lambda: ee.Number(1).getInfo())
+            return {
+                'status': 'ok',
+                'latency_ms': round((time.monotonic() - started) * 1000, 1),
+                'initialized_at': self.initialized_at,
+                'pid': os.getpid()
+            }
+        except Exception as e:
+            return {'status': 'error', 'error': str(e), 'pid': os.getpid()}
+
+
+ee_session = EESession()
+
+def _reset_lock_after_fork():
+    ee_session._lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_lock_after_fork)
+
+def initialize_ee():
+    """Initializes the Earth Engine library for this process if it isn't already."""
+    ee_session.initialize()
+
+def ensure_ee_initialized(func):
+    """Decorator to ensure Earth Engine is initialized before calling the function."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        initialize_ee() # Initializes once per process
+        try:
+            return ee_session.call(func, *args, **kwargs)
+        except ee.EEException as e:
+            logging.error(f"Earth Engine API error in {func.__name__}: {e}")
+            # Consider returning a default value (like None or []) or raising a custom app error
+            raise RuntimeError(f"An Earth Engine error occurred: {e}")
+        except Exception as e:
+            logging.exception(f"Unexpected error in GEE function {func.__name__}")
+            raise # Re-raise other unexpected errors
+    return wrapper
@@ -0,0 +1,214 @@
+"""
+Vector tiles of the FLA polygons, built from the cached asset GeoJSON.
+
+The polygons are projected once per asset version. Each zoom level gets its own
+Douglas-Peucker simplified copy, built on first use, plus an index of the features
+that touch each tile. The index covers zooms up to MVT_INDEX_MAX_ZOOM; deeper tiles
+filter their ancestor's bucket by bounding box. Tiles carry the polygons' properties
+and the status of each FLA's latest alert, and encoded tiles are kept in a small LRU.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from dotenv import load_dotenv
+
+from app.utils import mvt
+from app.utils.tile_cache import MemoryCacheBackend
+
+load_dotenv()
+
+# --- Configuration ---
+MVT_LAYER_NAME = 'flas'
+MVT_MIN_ZOOM = int(os.getenv('MVT_MIN_ZOOM', 0))
+MVT_MAX_ZOOM = int(os.getenv('MVT_MAX_ZOOM', 20))
+MVT_INDEX_MAX_ZOOM = int(os.getenv('MVT_INDEX_MAX_ZOOM', 14))
+MVT_SIMPLIFY_TOLERANCE = float(os.getenv('MVT_SIMPLIFY_TOLERANCE', 2)) # In tile units (of EXTENT)
+MVT_BUFFER = int(os.getenv('MVT_BUFFER', 64)) # In tile units
+MVT_TILE_CACHE_ENTRIES = int(os.getenv('MVT_TILE_CACHE_ENTRIES', 2048))
+MVT_TILE_CACHE_TTL_SECONDS = int(os.getenv('MVT_TILE_CACHE_TTL_SECONDS', 60 * 60))
+ALERT_STATUS_TTL_SECONDS = int(os.getenv('ALERT_STATUS_TTL_SECONDS', 60))
+
+
+def _polygons_of(geometry: dict) -> list:
+    if not geometry:
+        return []
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    if geometry.get('type') == 'GeometryCollection':
+        return [polygon for part in geometry.get('geometries', []) for polygon in _polygons_of(part)]
+    return []
+
+
+class FlaTileIndex:
+    """Projected FLA polygons with per-zoom simplified geometry and tile buckets."""
+
+    def __init__(self, geojson: dict, version: str):
+        self.version = version
+        self.features = []  # {'id', 'properties', 'polygons', 'bbox'}
+        for i, feature in enumerate(geojson.get('features', [])):
+            polygons = [
+                [[mvt.lonlat_to_world(lon, lat) for lon, lat, *_ in ring] for ring in polygon if len(ring) >= 4]
+                for polygon in _polygons_of(feature.get('geometry'))
+            ]
+            polygons = [polygon for polygon in polygons if polygon]
+            if not polygons:
+                continue
+            boxes = [mvt.bbox(polygon[0]) for polygon in polygons]
+            properties = {
+                key: value for key, value in (feature.get('properties') or {}).items()
+                if isinstance(value, (str, int, float, bool))
+            }
+            self.features.append({
+                'id': i + 1,
+                'properties': properties,
+                'polygons': polygons,
+                'bbox': (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)),
+            })
+        self._zooms = {}
+        self._lock = threading.Lock()
+        logging.info(f"Built FLA tile index for {len(self.features)} feature(s)")
+
+    def _zoom(self, z: int) -> dict:
+        level = self._zooms.get(z)
+        if level is not None:
+            return level
+        with self._lock:
+            level = self._zooms.get(z)
+            if level is not None:
+                return level
+
+            tolerance = MVT_SIMPLIFY_TOLERANCE / (mvt.EXTENT * (1 << z))
+            geometries = [
+                [[mvt.simplify(ring, tolerance) for ring in polygon] for polygon in feature['polygons']]
+                for feature in self.features
+            ]
+            tiles = {}
+            n = 1 << z
+            for index, feature in enumerate(self.features):
+                min_x, min_y, max_x, max_y = feature['bbox']
+                for tx in range(max(0, int(min_x * n)), min(n - 1, int(max_x * n)) + 1):
+                    for ty in range(max(0, int(min_y * n)), min(n - 1, int(max_y * n)) + 1):
+                        tiles.setdefault((tx, ty), []).append(index)
+            level = self._zooms[z] = {'geometries': geometries, 'tiles': tiles}
+            return level
+
+    def _candidates(self, z: int, x: int, y: int):
+        """Returns (feature indexes, geometries) for the tile."""
+        if z <= MVT_INDEX_MAX_ZOOM:
+            level = self._zoom(z)
+            return level['tiles'].get((x, y), []), level['geometries']
+
+        # Below the indexed zooms: filter the ancestor's bucket, geometry is not simplified further
+        shift = z - MVT_INDEX_MAX_ZOOM
+        level = self._zoom(MVT_INDEX_MAX_ZOOM)
+        min_x, min_y, max_x, max_y = mvt.tile_bounds(z, x, y)
+        indexes = [
+            index for index in level['tiles'].get((x >> shift, y >> shift), [])
+            if self.features[index]['bbox'][0] <= max_x and self.features[index]['bbox'][2] >= min_x
+            and self.features[index]['bbox'][1] <= max_y and self.features[index]['bbox'][3] >= min_y
+        ]
+        return indexes, [feature['polygons'] for feature in self.features]
+
+    def encode_tile(self, z: int, x: int, y: int, alert_statuses: dict) -> bytes:
+        """Encodes the tile; returns b'' when no polygon intersects it."""
+        indexes, geometries = self._candidates(z, x, y)
+        if not indexes:
+            return b''
+
+        bounds = mvt.tile_bounds(z, x, y)
+        pad = (bounds[2] - bounds[0]) * MVT_BUFFER / mvt.EXTENT
+        clip_box = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+
+        features = []
+        for index in indexes:
+            rings = []
+            for polygon in geometries[index]:
+                for ring_number, ring in enumerate(polygon):
+                    clipped = mvt.quantize_ring(mvt.clip_ring(ring[:-1], *clip_box), bounds)
+                    if len(clipped) < 3:
+                        if ring_number == 0:
+                            break  # Exterior gone, skip the holes too
+                        continue
+                    area = mvt.ring_area(clipped)
+                    if area == 0:
+                        if ring_number == 0:
+                            break
+                        continue
+                    # Exterior rings positive, holes negative
+                    if (ring_number == 0) != (area > 0):
+                        clipped.reverse()
+                    rings.append(clipped)
+            if not rings:
+                continue
+            feature = self.features[index]
+            properties = dict(feature['properties'])
+            properties['alert_status'] = alert_statuses.get(str(properties.get('Name')), 'none')
+            features.append({'id': feature['id'], 'properties': properties, 'geometry': mvt.encode_polygon(rings)})
+
+        return mvt.encode_layer(MVT_LAYER_NAME, features) if features else b''
+
+
+_index = None
+_index_lock = threading.Lock()
+_tiles = MemoryCacheBackend(MVT_TILE_CACHE_ENTRIES)
+_alert_statuses = (0, '', {}) # (loaded at, digest, {fla: status})
+_alert_statuses_lock = threading.Lock()
+
+def get_fla_tile_index(asset_id: str) -> FlaTileIndex:
+    """Returns the tile index for the asset's current GeoJSON, rebuilding it when it changes."""
+    global _index
+    from app.utils.isdaan_ee_service import get_asset_geojson
+
+    etag, data = get_asset_geojson(asset_id)
+    index = _index
+    if index is not None and index.version == etag:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != etag:
+            _index = FlaTileIndex(json.loads(data), etag)
+        return _index
+
+def latest_alert_statuses():
+    """
+    Returns (digest, {fla: status of its latest alert}), re-read from the database at
+    most every ALERT_STATUS_TTL_SECONDS. Requires an app context.
+    """
+    global _alert_statuses
+    loaded_at, digest, statuses = _alert_statuses
+    if time.time() - loaded_at < ALERT_STATUS_TTL_SECONDS:
+        return digest, statuses
+
+    with _alert_statuses_lock:
+        if _alert_statuses[0] != loaded_at:
+            return _alert_statuses[1], _alert_statuses[2]
+        from app.models import Alerts
+
+        try:
+            rows = Alerts.query.with_entities(Alerts.fla, Alerts.status) \
+                .distinct(Alerts.fla) \
+                .order_by(Alerts.fla, Alerts.datetime.desc()) \
+                .all()
+            statuses = {str(fla): status for fla, status in rows}
+            digest = hashlib.sha1(json.dumps(sorted(statuses.items())).encode('utf-8')).hexdigest()[:12]
+        except Exception as e:
+            logging.warning(f"Could not load alert statuses for FLA tiles: {e}")
+        _alert_statuses = (time.time(), digest, statuses)
+        return digest, statuses
+
+def get_fla_tile(asset_id: str, z: int, x: int, y: int):
+    """Returns (etag, MVT bytes) of an FLA tile."""
+    index = get_fla_tile_index(asset_id)
+    digest, statuses = latest_alert_statuses()
+    key = f"{index.version}:{digest}:{z}/{x}/{y}"
+    data = _tiles.get(key)
+    if data is None:
+        data = index.encode_tile(z, x, y, statuses)
+        _tiles.set(key, data, MVT_TILE_CACHE_TTL_SECONDS)
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return etag, data
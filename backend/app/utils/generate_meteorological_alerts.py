@@ -0,0 +1,124 @@
+"""
+Generates meteorological alerts (gust speed, rainfall) from the OpenWeatherMap forecast.
+
+The forecast is fetched once per distinct weather grid cell covering the FLA centroids,
+every forecast step is compared with every FLA's thresholds in one vectorized pass, and
+the resulting alerts are inserted in bulk, at most one per FLA, parameter and day.
+"""
+
+import logging
+import os
+from datetime import datetime
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    from app.utils.isdaan_ee_service import get_polygon_centroids
+    from app.utils.weather_client import fetch_forecasts, snap_to_grid, WeatherError
+    from app.utils.threshold_engine import ThresholdEngine, METEOROLOGICAL_PARAMETERS
+    from app.utils.alert_store import build_alert_row, insert_alerts
+    from app.config import Config
+except ImportError as e:
+    print(f"Import Error: {e}. Ensure the script is run from a context where the models, ee_service, and config are accessible.")
+    print("You might need to adjust PYTHONPATH or run as a module (e.g. python -m app.utils.generate_meteorological_alerts).")
+    exit(1)
+
+# --- Configuration ---
+DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
+ISDAAN_FLAS_ASSET_ID = os.getenv("ISDAAN_FLAS_ASSET_ID")
+PARAMETERS_TO_CHECK = list(METEOROLOGICAL_PARAMETERS)
+FORECAST_STEP_HOURS = 3 # OpenWeatherMap reports rainfall in mm per 3-hour step
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Database Setup ---
+engine = create_engine(DATABASE_URI)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def forecast_arrays(forecast: dict):
+    """Returns the forecast step dates and a (steps, parameters) array in threshold units."""
+    steps = forecast["forecast"]
+    dates = np.array([datetime.strptime(step["datetime"], '%Y-%m-%d %H:%M:%S').date() for step in steps], dtype=object)
+    values = np.array([
+        [step.get("gust_speed") or 0, (step.get("rainfall") or 0) / FORECAST_STEP_HOURS]
+        for step in steps
+    ], dtype=float).reshape(len(steps), len(PARAMETERS_TO_CHECK))
+    return dates, values
+
+def forecast_readings(centroids, forecasts):
+    """
+    Broadcasts each grid cell's forecast to the FLAs in that cell.
+    Returns flat, parallel arrays (flas, parameters, dates, values) with one reading per
+    FLA, forecast step and parameter.
+    """
+    flas_by_cell = {}
+    for name, lon, lat in centroids:
+        flas_by_cell.setdefault(snap_to_grid(lat, lon), []).append(str(name))
+
+    parts = []
+    for cell, cell_flas in flas_by_cell.items():
+        forecast = forecasts.get(cell)
+        if forecast is None or isinstance(forecast, WeatherError):
+            logging.warning(f"No forecast for {len(cell_flas)} FLA(s) in grid cell {cell}; skipped.")
+            continue
+        dates, values = forecast_arrays(forecast)
+        n_flas, n_steps, n_params = len(cell_flas), len(dates), len(PARAMETERS_TO_CHECK)
+        # (fla, step, parameter) grid, flattened in C order
+        parts.append((
+            np.repeat(np.asarray(cell_flas, dtype=str), n_steps * n_params),
+            np.tile(np.asarray(PARAMETERS_TO_CHECK, dtype=str), n_flas * n_steps),
+            np.tile(np.repeat(dates, n_params), n_flas),
+            np.broadcast_to(values, (n_flas, n_steps, n_params)).ravel(),
+        ))
+
+    if not parts:
+        return [], [], [], []
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(4))
+
+
+def generate_alerts():
+    """Fetches the forecast for every FLA, compares it with the thresholds and stores new alerts."""
+    logging.info("Starting meteorological alert generation process...")
+    db = SessionLocal()
+
+    try:
+        thresholds = ThresholdEngine.load(db, METEOROLOGICAL_PARAMETERS)
+        if not len(thresholds):
+            logging.info("No parameter thresholds found in the database.")
+            return
+
+        centroids = [row for row in get_polygon_centroids(ISDAAN_FLAS_ASSET_ID) if thresholds.has_fla(str(row[0]))]
+        forecasts = fetch_forecasts(snap_to_grid(lat, lon) for _, lon, lat in centroids)
+        logging.info(f"Fetched forecasts for {len(forecasts)} grid cell(s) covering {len(centroids)} FLAs.")
+
+        flas, parameters, dates, values = forecast_readings(centroids, forecasts)
+        breaches = thresholds.evaluate(flas, parameters, dates, values)
+
+        # One alert per FLA, parameter and day: keep the worst forecast step
+        breaches.sort(key=lambda breach: breach['value'])
+        alert_rows = [
+            build_alert_row(breach['fla'], breach['parameter'], breach['date'], breach['message'], alert_type='meteorological')
+            for breach in breaches
+        ]
+        inserted = insert_alerts(db, alert_rows)
+
+        if inserted:
+            db.commit()
+            logging.info(f"Committed {inserted} new alerts.")
+        else:
+            db.rollback()
+            logging.info("No new alerts needed.")
+
+    except SQLAlchemyError as e:
+        logging.error(f"Database error during alert generation: {e}")
+        db.rollback()
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+        logging.info("Meteorological alert generation complete.")
+
+if __name__ == "__main__":
+    generate_alerts()
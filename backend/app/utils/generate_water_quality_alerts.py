@@ -1,13 +1,19 @@
 import logging
 import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta, date
-from sqlalchemy import create_engine, func, and_
-from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 
 try:
-    from app.models import Cage, Alerts, ParameterThresholds, db
-    from app.utils.ee_service import get_point_parameter_values
+    from app.utils.isdaan_ee_service import get_all_parameter_means_per_polygon, get_scene_index
+    from app.utils.scene_index import date_to_ms, ms_to_date, DAY_MS, SCENE_INDEX_OVERLAP_DAYS
+    from app.utils.threshold_engine import ThresholdEngine, WATER_QUALITY_PARAMETERS
+    from app.utils.alert_store import build_alert_row, insert_alerts, load_watermarks, advance_watermarks, ms_to_utc
+    from app.utils.alert_store import completed_backfill_shards, record_backfill_shard
     from app.config import Config
 except ImportError as e:
     print(f"Import Error: {e}. Ensure the script is run from a context where the models, ee_service, and config are accessible.")
@@ -17,175 +23,151 @@ except ImportError as e:
 
 # --- Configuration ---
 DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
-PARAMETERS_TO_CHECK = ['chlorophyll', 'turbidity', 'tss']
-GEE_LOOKBACK_DAYS = 14
+ISDAAN_FLAS_ASSET_ID = os.getenv("ISDAAN_FLAS_ASSET_ID")
+PARAMETERS_TO_CHECK = list(WATER_QUALITY_PARAMETERS)
+GEE_LOOKBACK_DAYS = 14 # Window for FLAs/parameters that have no watermark yet
+CLOUD_COVER = 20
+# Scenes can be ingested after newer ones were processed; re-check this window before each watermark
+ALERT_RECHECK_DAYS = int(os.getenv('ALERT_RECHECK_DAYS', SCENE_INDEX_OVERLAP_DAYS))
+BACKFILL_WORKERS = int(os.getenv('ALERT_BACKFILL_WORKERS', 4))
+# Ids of the scenes in the re-check window evaluated by the last run
+SEEN_SCENES_PATH = os.path.join(Config.CACHE_DIR, 'alert_seen_scenes.json')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Database Setup ---
 engine = create_engine(DATABASE_URI)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def check_threshold(parameter_name, value, thresholds):
-    """Checks if a value is outside the min/max threshold for a parameter."""
-    model_prefix = parameter_name
-    if parameter_name == 'chlorophyll':
-        model_prefix = 'chla'
-
-    min_val = getattr(thresholds, f"{model_prefix}_min", None)
-    max_val = getattr(thresholds, f"{model_prefix}_max", None)
+def new_readings(rows, watermarks, default_ms, recheck_ms=0):
+    """
+    Picks the parameter values of every scene acquired after its FLA/parameter watermark
+    minus recheck_ms. FLAs and parameters without a watermark yet use default_ms.
+    Returns parallel lists (flas, parameters, dates, values) for the threshold engine,
+    and {(fla, parameter): newest scene time in ms} for the watermarks that move forward.
+    """
+    flas, parameters, dates, values = [], [], [], []
+    advanced = {}
+    for row in rows:
+        name, row_date, row_time = row.get('Name'), row.get('date'), row.get('time')
+        if name is None or not row_date or row_time is None:
+            continue
+        fla = str(name)
+        for param in PARAMETERS_TO_CHECK:
+            key = (fla, param)
+            watermark = watermarks.get(key, default_ms)
+            if row_time <= watermark - recheck_ms:
+                continue
+            # A scene that masks the polygon out is still processed
+            if row_time > watermark:
+                advanced[key] = max(advanced.get(key, row_time), row_time)
+            if row.get(param) is None:
+                continue
+            flas.append(fla)
+            parameters.append(param)
+            dates.append(datetime.strptime(row_date, '%Y-%m-%d').date())
+            values.append(row[param])
+    return flas, parameters, dates, values, advanced
 
-    if value is None:
-        return False, f"No data available for {parameter_name.capitalize()}"
 
-    if min_val is None or max_val is None:
-        return False, f"No thresholds defined for {parameter_name.capitalize()}"
+def load_seen_scenes() -> set:
+    try:
+        with open(SEEN_SCENES_PATH) as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
 
+def save_seen_scenes(scene_ids: list):
     try:
-        value = float(value)
-    except (ValueError, TypeError):
-        return False, f"Invalid {parameter_name.capitalize()} reading: {value}"
-
-    # Parameter-specific messaging
-    if parameter_name == 'chlorophyll':
-        if value < min_val:
-            return True, (f"Chlorophyll too low: {value:.2f} (min {min_val:.2f}). "
-                         "Low algal activity may reduce oxygen levels.")
-        elif value > max_val:
-            return True, (f"Chlorophyll too high: {value:.2f} (max {max_val:.2f}). "
-                         "Potential algal bloom, may cause oxygen depletion.")
-
-    elif parameter_name == 'turbidity':
-        if value < min_val:
-            return True, (f"Turbidity too low: {value:.2f} (min {min_val:.2f}). "
-                         "Water unusually clear, may lack nutrients.")
-        elif value > max_val:
-            return True, (f"Turbidity too high: {value:.2f} (max {max_val:.2f}). "
-                         "Reduces light penetration, may stress fish.")
-
-    elif parameter_name == 'tss':
-        if value < min_val:
-            return True, (f"Suspended solids too low: {value:.2f} (min {min_val:.2f}). "
-                         "Insufficient particles for filter feeders.")
-        elif value > max_val:
-            return True, (f"Suspended solids too high: {value:.2f} (max {max_val:.2f}). "
-                         "May clog fish gills, indicates possible runoff.")
-
-    return False, (f"{parameter_name.capitalize()} normal: {value:.2f} "
-                  f"(range {min_val:.2f}-{max_val:.2f} ")
-
-
-def check_existing_alert(db_session, cage_id, target_date, parameter_name):
-    """Checks if an alert for this cage, parameter, and date already exists."""
+        os.makedirs(os.path.dirname(SEEN_SCENES_PATH), exist_ok=True)
+        tmp_path = f"{SEEN_SCENES_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(scene_ids, f)
+        os.replace(tmp_path, SEEN_SCENES_PATH)
+    except OSError as e:
+        logging.warning(f"Could not save the seen alert scenes: {e}")
+
+def has_new_scenes(watermark_ms, recheck_from_ms, end_date, seen):
+    """
+    Checks the local scene index for scenes acquired after watermark_ms, or indexed since
+    the last run within the re-check window starting at recheck_from_ms, so runs without
+    new imagery skip the Earth Engine reduction. Returns (whether to run, ids of the
+    scenes in the re-check window, or None if the index can't be read).
+    """
     try:
-        alert_exists = db_session.query(Alerts).filter(
-            Alerts.cage_id == cage_id,
-            func.date(Alerts.datetime) == target_date,
-            Alerts.alert_message.like(f'%{parameter_name.capitalize()}%too %')
-        ).first()
-        return alert_exists is not None
-    except SQLAlchemyError as e:
-        logging.error(f"Database error checking existing alerts for cage {cage_id} on {target_date}: {e}")
-        return True
+        index = get_scene_index(ISDAAN_FLAS_ASSET_ID)
+        scenes = index.query(ms_to_date(recheck_from_ms), end_date, CLOUD_COVER)
+    except Exception as e:
+        logging.warning(f"Scene index unavailable, querying Earth Engine directly: {e}")
+        return True, None
+    scene_ids = [scene_id for _, scene_id, _ in scenes]
+    return any(t > watermark_ms or scene_id not in seen for t, scene_id, _ in scenes), scene_ids
 
 
 def generate_alerts():
-    """Fetches GEE data, compares with thresholds, generates alerts and updates cage status."""
+    """
+    Evaluates the thresholds of every FLA against the Sentinel-2 scenes acquired since the
+    last run and stores new alerts. Per-FLA/parameter watermarks record the last processed
+    scene and are advanced in the same transaction as the alert inserts. Scenes acquired up
+    to ALERT_RECHECK_DAYS before a watermark are evaluated again when a scene newer than
+    the watermark or one not seen by the last run is indexed, so scenes that Earth Engine
+    ingests after newer ones are not missed; their alerts are deduplicated on insert.
+    """
     logging.info("Starting alert generation process...")
     db = SessionLocal()
 
     try:
         today = date.today()
-        start_date = (today - timedelta(days=GEE_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-
-        cages = db.query(Cage).options(joinedload(Cage.thresholds)).all()
-        logging.info(f"Found {len(cages)} cages to check.")
+        end_date = (today + timedelta(days=1)).strftime('%Y-%m-%d')
+        # First run for an FLA/parameter: look back GEE_LOOKBACK_DAYS
+        default_ms = date_to_ms((today - timedelta(days=GEE_LOOKBACK_DAYS)).strftime('%Y-%m-%d'))
 
-        if not cages:
-            logging.info("No cages found in the database.")
+        thresholds = ThresholdEngine.load(db)
+        if not len(thresholds):
+            logging.info("No parameter thresholds found in the database.")
             return
 
-        alerts_to_add = []
-        cages_to_update = set()
-
-        for cage in cages:
-            if not cage.thresholds:
-                logging.warning(f"Cage ID {cage.cage_id} ({cage.cage_name}) has no associated thresholds. Skipping.")
-                continue
-
-            logging.info(f"Processing Cage ID: {cage.cage_id}, Name: {cage.cage_name}, Location: ({cage.lon}, {cage.lat})")
-            cage_coords = [cage.lon, cage.lat]
-            latest_data_for_cage = {}
-            latest_overall_date_obj = None
-
-            for param in PARAMETERS_TO_CHECK:
-                try:
-                    logging.debug(f"Fetching GEE data for {param} for cage {cage.cage_id}...")
-                    param_values = get_point_parameter_values(
-                        parameter=param,
-                        point_coords=cage_coords,
-                        start_date=start_date,
-                        end_date=end_date
-                    )
-
-                    if param_values:
-                        latest_entry = max(param_values, key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d').date())
-                        latest_date_str = latest_entry['date']
-                        latest_value = latest_entry['value']
-                        latest_date_obj = datetime.strptime(latest_date_str, '%Y-%m-%d').date()
-
-                        if latest_value is not None:
-                            latest_data_for_cage[param] = {'value': latest_value, 'date': latest_date_str}
-                            if latest_overall_date_obj is None or latest_date_obj > latest_overall_date_obj:
-                                latest_overall_date_obj = latest_date_obj
-                        else:
-                            logging.warning(f"GEE returned None value for {param} for cage {cage.cage_id} on {latest_date_str}.")
-                    else:
-                        logging.warning(f"No GEE data found for {param} for cage {cage.cage_id} between {start_date} and {end_date}.")
-
-                except Exception as e:
-                    logging.error(f"Error fetching GEE data for {param} for cage {cage.cage_id}: {e}")
-                    continue
-
-            if latest_overall_date_obj is None:
-                logging.warning(f"No GEE data found for any parameter for cage {cage.cage_id} in the lookback period.")
-                continue
+        watermarks = load_watermarks(db)
+        recheck_ms = ALERT_RECHECK_DAYS * DAY_MS
+        since_ms = min(
+            watermarks.get((str(fla), param), default_ms)
+            for fla in thresholds.flas for param in PARAMETERS_TO_CHECK
+        )
+        run, window_scene_ids = has_new_scenes(since_ms, since_ms - recheck_ms, end_date, load_seen_scenes())
+        if not run:
+            logging.info(f"No new scenes since {ms_to_utc(since_ms)}; nothing to do.")
+            return
 
-            logging.info(f"Latest data found for cage {cage.cage_id} on {latest_overall_date_obj.strftime('%Y-%m-%d')}")
-
-            for param, data in latest_data_for_cage.items():
-                data_date_obj = datetime.strptime(data['date'], '%Y-%m-%d').date()
-                if data_date_obj == latest_overall_date_obj:
-                    value = data['value']
-                    is_breached, message = check_threshold(param, value, cage.thresholds)
-
-                    if is_breached:
-                        logging.warning(f"Threshold breach for Cage {cage.cage_id}: {message}")
-                        if not check_existing_alert(db, cage.cage_id, latest_overall_date_obj, param):
-                            new_alert = Alerts(
-                                cage_id=cage.cage_id,
-                                alert_type='water quality',
-                                alert_message=message,
-                                datetime=datetime.combine(latest_overall_date_obj, datetime.min.time()),
-                                status='pending'
-                            )
-                            alerts_to_add.append(new_alert)
-                            cages_to_update.add(cage.cage_id)
-
-        if alerts_to_add:
-            db.add_all(alerts_to_add)
-
-        if cages_to_update:
-            db.query(Cage).filter(Cage.cage_id.in_(cages_to_update)).update(
-                {Cage.status: 'at risk'},
-                synchronize_session=False
-            )
-
-        if alerts_to_add or cages_to_update:
+        # One multi-band reduction covers every parameter, polygon and scene to evaluate
+        start_date = ms_to_date(since_ms - recheck_ms)
+        rows = get_all_parameter_means_per_polygon(start_date, end_date, ISDAAN_FLAS_ASSET_ID, CLOUD_COVER)
+        flas, parameters, dates, values, advanced = new_readings(rows, watermarks, default_ms, recheck_ms)
+        logging.info(f"Evaluating {len(values)} readings (new and re-checked) for {len(set(flas))} FLAs between {start_date} and {end_date}.")
+
+        missing = sorted(fla for fla in set(flas) if not thresholds.has_fla(fla))
+        if missing:
+            logging.warning(f"{len(missing)} FLA(s) have no associated thresholds and are skipped: {', '.join(missing)}")
+        # Only FLAs with thresholds hold back since_ms, so only theirs are tracked
+        advanced = {key: ms for key, ms in advanced.items() if thresholds.has_fla(key[0])}
+
+        breaches = thresholds.evaluate(flas, parameters, dates, values)
+        for breach in breaches:
+            logging.warning(f"Threshold breach for FLA {breach['fla']}: {breach['message']}")
+
+        alert_rows = [
+            build_alert_row(breach['fla'], breach['parameter'], breach['date'], breach['message'])
+            for breach in breaches
+        ]
+        inserted = insert_alerts(db, alert_rows)
+        advance_watermarks(db, advanced)
+
+        if inserted or advanced:
             db.commit()
-            logging.info(f"Committed {len(alerts_to_add)} new alerts and {len(cages_to_update)} status updates.")
+            logging.info(f"Committed {inserted} new alerts and advanced {len(advanced)} watermarks.")
         else:
-            logging.info("No new alerts or status updates needed.")
+            db.rollback()
+            logging.info("No new alerts needed.")
+        if window_scene_ids is not None:
+            save_seen_scenes(window_scene_ids)
 
     except SQLAlchemyError as e:
         logging.error(f"Database error during alert generation: {e}")
@@ -197,5 +179,116 @@ def generate_alerts():
         db.close()
         logging.info("Alert generation complete.")
 
+def monthly_shards(start: date, end: date) -> list:
+    """Splits [start, end) into calendar-month shards of (shard_start, shard_end) dates."""
+    shards = []
+    shard_start = start
+    while shard_start < end:
+        next_month = (shard_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        shard_end = min(next_month, end)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end
+    return shards
+
+
+def _init_backfill_worker():
+    # Connections inherited from the parent must not be shared; the pool reconnects lazily.
+    # Earth Engine re-initializes on first use because the session is keyed by process id.
+    engine.dispose(close=False)
+
+
+def backfill_shard(shard_start: date, shard_end: date) -> int:
+    """
+    Generates the alerts of every scene in [shard_start, shard_end) and commits them
+    together with the shard's progress row. Alerts are deduplicated on insert, so a
+    shard can safely be re-run. Watermarks of the scheduled job are left untouched.
+    """
+    db = SessionLocal()
+    try:
+        thresholds = ThresholdEngine.load(db)
+        rows = get_all_parameter_means_per_polygon(
+            shard_start.strftime('%Y-%m-%d'), shard_end.strftime('%Y-%m-%d'), ISDAAN_FLAS_ASSET_ID, CLOUD_COVER
+        )
+        flas, parameters, dates, values, _ = new_readings(rows, {}, float('-inf'))
+        breaches = thresholds.evaluate(flas, parameters, dates, values)
+        alert_rows = [
+            build_alert_row(breach['fla'], breach['parameter'], breach['date'], breach['message'])
+            for breach in breaches
+        ]
+        inserted = insert_alerts(db, alert_rows)
+        record_backfill_shard(db, shard_start, shard_end, inserted)
+        db.commit()
+        return inserted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill_alerts(start: date, end: date, workers: int = BACKFILL_WORKERS):
+    """
+    Generates alerts for a past period. The range is split into monthly shards that are
+    processed in parallel worker processes. Completed shards are recorded in the database
+    and skipped on the next invocation, so an interrupted backfill resumes where it stopped.
+    """
+    shards = monthly_shards(start, end)
+    db = SessionLocal()
+    try:
+        done = completed_backfill_shards(db)
+    finally:
+        db.close()
+
+    pending = [shard for shard in shards if shard not in done]
+    logging.info(f"Backfilling alerts from {start} to {end}: {len(shards)} shard(s), "
+                 f"{len(shards) - len(pending)} already completed, {len(pending)} to process with {workers} worker(s).")
+    if not pending:
+        return
+
+    # Don't hand the parent's open connections to the forked workers
+    engine.dispose()
+    failed = []
+    total_inserted = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker) as executor:
+        futures = {executor.submit(backfill_shard, *shard): shard for shard in pending}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            shard_start, shard_end = futures[future]
+            try:
+                inserted = future.result()
+                total_inserted += inserted
+                logging.info(f"[{completed}/{len(pending)}] Shard {shard_start} to {shard_end}: {inserted} new alerts.")
+            except Exception as e:
+                failed.append(futures[future])
+                logging.error(f"[{completed}/{len(pending)}] Shard {shard_start} to {shard_end} failed: {e}")
+
+    logging.info(f"Backfill finished: {total_inserted} new alerts, {len(failed)} failed shard(s).")
+    if failed:
+        logging.info("Re-run the same backfill command to retry the failed shards.")
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
 if __name__ == "__main__":
-    generate_alerts()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BAYSENSE water quality alert generator.")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # Run script: (python -m app.utils.generate_water_quality_alerts [run])
+    subparsers.add_parser("run", help="Process scenes acquired since the last run (default).")
+    # Run script: (python -m app.utils.generate_water_quality_alerts backfill --start 2024-01-01 --end 2025-01-01)
+    parser_backfill = subparsers.add_parser("backfill", help="Generate alerts for a past date range.")
+    parser_backfill.add_argument("--start", type=_parse_date, required=True, help="First date (YYYY-MM-DD).")
+    parser_backfill.add_argument("--end", type=_parse_date, required=True, help="End date, exclusive (YYYY-MM-DD).")
+    parser_backfill.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Number of worker processes.")
+
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        if args.start >= args.end:
+            parser.error("--start must be before --end")
+        backfill_alerts(args.start, args.end, max(1, args.workers))
+    else:
+        generate_alerts()
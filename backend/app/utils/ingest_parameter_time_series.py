@@ -0,0 +1,70 @@
+"""
+Ingests per-FLA parameter means of new Sentinel-2 scenes into ParameterTimeSeries.
+
+Scenes are taken from the local scene index; only those not yet in the table are
+reduced with Earth Engine. Each batch is committed on its own, so an interrupted run
+continues where it stopped.
+"""
+
+import logging
+import os
+from datetime import date, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    from app.utils.isdaan_ee_service import get_scene_index, get_all_parameter_means_for_scenes
+    from app.utils.scene_index import SCENE_INDEX_START_DATE
+    from app.utils.time_series_store import store_scene_means, ingested_scene_ids
+    from app.config import Config
+except ImportError as e:
+    print(f"Import Error: {e}. Ensure the script is run from a context where the models, ee_service, and config are accessible.")
+    print("You might need to adjust PYTHONPATH or run as a module (e.g. python -m app.utils.ingest_parameter_time_series).")
+    exit(1)
+
+# --- Configuration ---
+DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
+ISDAAN_FLAS_ASSET_ID = os.getenv("ISDAAN_FLAS_ASSET_ID")
+# Scenes cloudier than this are left to on-demand computation
+TIME_SERIES_MAX_CLOUD = float(os.getenv("TIME_SERIES_MAX_CLOUD", 50))
+INGEST_BATCH_SCENES = int(os.getenv("INGEST_BATCH_SCENES", 100))
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Database Setup ---
+engine = create_engine(DATABASE_URI)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def ingest_time_series():
+    """Stores the parameter means of every indexed scene that isn't in the table yet."""
+    logging.info("Starting parameter time series ingestion...")
+    db = SessionLocal()
+
+    try:
+        end_date = (date.today() + timedelta(days=1)).strftime('%Y-%m-%d')
+        index = get_scene_index(ISDAAN_FLAS_ASSET_ID)
+        scenes = index.query(SCENE_INDEX_START_DATE, end_date, TIME_SERIES_MAX_CLOUD)
+        done = ingested_scene_ids(db)
+        missing = [(t, scene_id) for t, scene_id, _ in scenes if scene_id not in done]
+        clouds = {scene_id: cloud for _, scene_id, cloud in scenes}
+        logging.info(f"{len(scenes)} indexed scene(s), {len(missing)} to ingest.")
+
+        for start in range(0, len(missing), INGEST_BATCH_SCENES):
+            batch = missing[start:start + INGEST_BATCH_SCENES]
+            means_rows = get_all_parameter_means_for_scenes(batch, ISDAAN_FLAS_ASSET_ID)
+            stored = store_scene_means(db, means_rows, clouds, batch)
+            db.commit()
+            logging.info(f"[{min(start + len(batch), len(missing))}/{len(missing)}] Stored {stored} rows for {len(batch)} scene(s).")
+
+    except SQLAlchemyError as e:
+        logging.error(f"Database error during ingestion: {e}")
+        db.rollback()
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+        logging.info("Parameter time series ingestion complete.")
+
+if __name__ == "__main__":
+    ingest_time_series()
@@ -1,80 +1,41 @@
 import ee
 import os
 import json
+import time
+import hashlib
 import threading
 import datetime
 import logging
 from dotenv import load_dotenv
 from functools import lru_cache
 
+from app.utils.ee_session import ensure_ee_initialized
+from app.utils.tile_cache import cached_tile_result
+from app.utils.tile_proxy import register_layer_kind
+from app.utils.single_flight import single_flight
+from app.utils.asset_store import VersionedAssetStore
+from app.utils.scene_index import SceneIndex
+from app.utils.ee_executor import submit_ee, fan_out
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
-# --- GEE Initialization Handling ---
-_ee_initialized = threading.local() # Thread-local storage for initialization status
-def initialize_ee():
-    """
-    Initializes the Earth Engine library using service account credentials. 
-    Ensures initialization happens only once per thread/context.
-    """
-    # Check if already initialized in the current thread/context
-    if getattr(_ee_initialized, 'status', False):
-        return
-
-    logging.info("Attempting to initialize Earth Engine...")
-    try:
-        project_id = os.getenv('EE_PROJECT_ID')
-        credential_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-        service_account = os.getenv('EE_SERVICE_ACCOUNT')
-
-        if not project_id:
-            # Log a warning but proceed, GEE might infer project from credentials
-            logging.warning("EE_PROJECT_ID environment variable not set. GEE will attempt to infer project from credentials.")
-        
-        if not service_account:
-            # Log a warning but proceed, GEE might infer project from credentials
-            logging.warning("EE_SERVICE_ACCOUNT environment variable not set. GEE will attempt to infer project from credentials.")
-
-        if not credential_path:
-            # This is usually critical for service account auth
-            raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set. Please point it to your service account key file.")
-        elif not os.path.exists(credential_path):
-             raise FileNotFoundError(f"Service account key file not found at path specified by GOOGLE_APPLICATION_CREDENTIALS: {credential_path}")
-        
-        credentials=ee.ServiceAccountCredentials(service_account, credential_path)
-
-        ee.Initialize(project=project_id, credentials=credentials, opt_url='https://earthengine-highvolume.googleapis.com')
-
-        logging.info(f"Earth Engine Initialized Successfully for project: {project_id or 'inferred'}")
-        _ee_initialized.status = True # Mark as initialized for this thread
+S2_COLLECTION_ID = 'COPERNICUS/S2_SR_HARMONIZED'
 
-    except ee.EEException as eee: # Catch specific GEE init errors
-        logging.error(f"GEE Initialization Error: {eee}")
-        _ee_initialized.status = False
-        raise RuntimeError(f"Failed to initialize GEE: {eee}")
-    except Exception as e:
-        logging.exception("FATAL: Earth Engine Initialization Failed!") # Log full traceback
-        _ee_initialized.status = False
-        # Re-raise the original error for clarity
-        raise
+# Sentinel-2 band pairs for the normalized difference of each water quality parameter
+PARAMETER_BANDS = {
+    'chlorophyll': ['B5', 'B4'],
+    'turbidity': ['B4', 'B3'],
+    'tss': ['B2', 'B8'],
+}
+PARAMETER_PALETTE = ["blue", "green", "yellow", "red"]
 
-def ensure_ee_initialized(func):
-    """Decorator to ensure Earth Engine is initialized before calling the function."""
-    def wrapper(*args, **kwargs):
-        initialize_ee() # Check and initialize if needed for this thread/context
-        if not getattr(_ee_initialized, 'status', False):
-             # Handle case where initialization failed previously in this context
-             raise RuntimeError("Earth Engine is not initialized or initialization failed.")
-        try:
-            return func(*args, **kwargs)
-        except ee.EEException as e:
-            logging.error(f"Earth Engine API error in {func.__name__}: {e}")
-            # Consider returning a default value (like None or []) or raising a custom app error
-            raise RuntimeError(f"An Earth Engine error occurred: {e}")
-        except Exception as e:
-            logging.exception(f"Unexpected error in GEE function {func.__name__}")
-            raise # Re-raise other unexpected errors
-    return wrapper
+# Split per-polygon reductions into chunks of this many polygons (0 = single request)
+POLYGON_BATCH_CHUNK_SIZE = int(os.getenv('POLYGON_BATCH_CHUNK_SIZE', 0))
+# How often to re-check an asset's update time for cache invalidation
+ASSET_VERSION_CHECK_SECONDS = int(os.getenv('ASSET_VERSION_CHECK_SECONDS', 600))
+# Scenes reduced per request when computing means for an explicit list of scenes
+SCENES_PER_REQUEST = int(os.getenv('SCENES_PER_REQUEST', 25))
 
 @lru_cache(maxsize=5)
 @ensure_ee_initialized
@@ -90,43 +51,188 @@ def load_ee_asset(asset_id: str) -> ee.FeatureCollection:
         logging.error(f"Failed to load Earth Engine asset '{asset_id}': {e}")
         raise
 
+_asset_versions = {} # asset_id -> (update time, checked at)
+_asset_versions_lock = threading.Lock()
+
 @ensure_ee_initialized
-def get_asset_details(asset_id: str) -> str:
+def get_asset_version(asset_id: str):
     """
-    Returns all details (properties and geometry) from the specified EE asset
-    in a GeoJSON-compliant JSON format.
+    Returns the asset's update time, used to invalidate values derived from the asset.
+    The metadata lookup is repeated at most every ASSET_VERSION_CHECK_SECONDS.
+    Returns None if the update time cannot be determined.
     """
-    logging.info(f"Fetching details including geometry for asset: {asset_id}")
+    now = time.time()
+    with _asset_versions_lock:
+        known = _asset_versions.get(asset_id)
+    if known is not None and now - known[1] < ASSET_VERSION_CHECK_SECONDS:
+        return known[0]
+
     try:
-        asset = load_ee_asset(asset_id)
-        asset_info = asset.getInfo() # returns a GeoJSON dictionary
-        
-        return json.dumps(asset_info, indent=2)
+        version = ee.data.getAsset(asset_id).get('updateTime')
     except Exception as e:
-        logging.error(f"Error fetching details for asset {asset_id}: {e}")
-        return json.dumps({"error": str(e)})
+        logging.warning(f"Could not read update time for asset {asset_id}: {e}")
+        version = known[0] if known else None
+
+    if version is not None:
+        with _asset_versions_lock:
+            _asset_versions[asset_id] = (version, now)
+    return version
+
+def _asset_version_of(args: dict):
+    """Cache key version of a tile result: the update time of the asset it is built from."""
+    return get_asset_version(args['asset_id'])
+
+_roi_store = VersionedAssetStore(
+    'roi',
+    encode=lambda geometry: json.dumps(geometry).encode('utf-8'),
+    decode=lambda data: json.loads(data.decode('utf-8'))
+)
 
 @ensure_ee_initialized
 def get_combined_roi(asset_id: str) -> ee.Geometry:
     """
     Creates a single, combined geometry from all polygons in an EE asset.
     This is used for generating map tiles that cover the entire area of interest.
+    The dissolved geometry is materialized once per asset version and reused as a
+    literal geometry, so requests don't carry the union sub-graph.
     """
     logging.debug(f"Creating combined ROI from asset: {asset_id}")
     asset = load_ee_asset(asset_id)
-    # Dissolve all polygons into a single geometry
-    return asset.union(maxError=1).geometry()
+    version = get_asset_version(asset_id)
+    if version is None:
+        # Dissolve all polygons into a single geometry
+        return asset.union(maxError=1).geometry()
+
+    geometry = _roi_store.get(asset_id, version, lambda: asset.union(maxError=1).geometry().getInfo())
+    return ee.Geometry(geometry)
+
+_centroid_store = VersionedAssetStore(
+    'fla_centroids',
+    encode=lambda rows: json.dumps(rows).encode('utf-8'),
+    decode=lambda data: json.loads(data.decode('utf-8'))
+)
+
+@ensure_ee_initialized
+def get_polygon_centroids(asset_id: str) -> list:
+    """
+    Returns [name, lon, lat] for the centroid of every polygon in the asset.
+    Computed with a single request per asset version and stored like the ROI.
+    """
+    def build():
+        centroids = load_ee_asset(asset_id).map(
+            lambda f: ee.Feature(None, {
+                'Name': f.get('Name'),
+                'coords': f.geometry().centroid(maxError=1).coordinates()
+            })
+        )
+        rows = centroids.reduceColumns(ee.Reducer.toList(2), ['Name', 'coords']).get('list').getInfo()
+        return [[name, coords[0], coords[1]] for name, coords in rows if name is not None and coords]
+
+    version = get_asset_version(asset_id)
+    if version is None:
+        return build()
+    return _centroid_store.get(asset_id, version, build)
+
+# Compact GeoJSON bytes of each asset, served as-is by /get_asset_features
+_features_store = VersionedAssetStore('asset_features', encode=lambda data: data, decode=lambda data: data, suffix='.geojson')
+_feature_etags = {} # asset_id -> (version, etag)
+_feature_checks = {} # asset_id -> last version check
+_feature_refreshing = set()
+_feature_lock = threading.Lock()
+
+@ensure_ee_initialized
+def _build_asset_geojson(asset_id: str) -> bytes:
+    logging.info(f"Fetching details including geometry for asset: {asset_id}")
+    return json.dumps(load_ee_asset(asset_id).getInfo(), separators=(',', ':')).encode('utf-8')
+
+def _load_asset_geojson(asset_id: str):
+    version = get_asset_version(asset_id)
+    with _feature_lock:
+        _feature_checks[asset_id] = time.time()
+    if version is None:
+        data = _build_asset_geojson(asset_id)
+        return hashlib.sha256(data).hexdigest(), data
+
+    data = _features_store.get(asset_id, version, lambda: _build_asset_geojson(asset_id))
+    with _feature_lock:
+        known = _feature_etags.get(asset_id)
+        if known is None or known[0] != version:
+            known = _feature_etags[asset_id] = (version, hashlib.sha256(data).hexdigest())
+    return known[1], data
+
+def _refresh_asset_geojson(asset_id: str):
+    try:
+        _load_asset_geojson(asset_id)
+    except Exception as e:
+        logging.warning(f"Background refresh of asset features failed for {asset_id}: {e}")
+    finally:
+        with _feature_lock:
+            _feature_refreshing.discard(asset_id)
+
+def get_asset_geojson(asset_id: str):
+    """
+    Returns (etag, GeoJSON bytes) of every feature of the asset, properties and geometry.
+    The bytes are serialized once per asset version and kept in memory and on disk; the
+    etag is the SHA-256 of the bytes. Once loaded, requests are answered from memory and
+    the version is re-checked in the background every ASSET_VERSION_CHECK_SECONDS.
+    """
+    entry = _features_store.peek(asset_id)
+    if entry is None:
+        return _load_asset_geojson(asset_id)
+
+    version, data = entry
+    with _feature_lock:
+        known = _feature_etags.get(asset_id)
+        if known is None or known[0] != version:
+            known = _feature_etags[asset_id] = (version, hashlib.sha256(data).hexdigest())
+        etag = known[1]
+        due = time.time() - _feature_checks.get(asset_id, 0) >= ASSET_VERSION_CHECK_SECONDS
+        if due and asset_id not in _feature_refreshing:
+            _feature_refreshing.add(asset_id)
+            submit_ee(_refresh_asset_geojson, asset_id)
+    return etag, data
 
 @ensure_ee_initialized
 def filter_collection(roi: ee.Geometry, start_date: str, end_date: str, cloud_cover: int = 20) -> ee.ImageCollection:
     """Filter Sentinel-2 collection by date, a given ROI, and cloud cover."""
-    return ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+    return ee.ImageCollection(S2_COLLECTION_ID) \
         .filterBounds(roi) \
         .filterDate(start_date, end_date) \
         .filterMetadata('CLOUDY_PIXEL_PERCENTAGE', 'less_than', cloud_cover)
 @ensure_ee_initialized
+def _fetch_scenes_since(roi: ee.Geometry, since_ms: int):
+    """Returns [time_ms, scene_id, cloud_percentage] for every scene over the ROI since since_ms."""
+    collection = ee.ImageCollection(S2_COLLECTION_ID) \
+        .filterBounds(roi) \
+        .filterDate(ee.Date(since_ms), ee.Date(int(time.time() * 1000)))
+    return collection.reduceColumns(
+        ee.Reducer.toList(3), ['system:time_start', 'system:index', 'CLOUDY_PIXEL_PERCENTAGE']
+    ).get('list').getInfo()
+
+_scene_indexes = {} # asset_id -> SceneIndex
+_scene_indexes_lock = threading.Lock()
+
+def get_scene_index(asset_id: str) -> SceneIndex:
+    """Returns the scene index for the asset's ROI, refreshed if it is due."""
+    with _scene_indexes_lock:
+        index = _scene_indexes.get(asset_id)
+        if index is None:
+            index = _scene_indexes[asset_id] = SceneIndex(f"isdaan-{asset_id.replace('/', '_')}")
+    version = get_asset_version(asset_id) or 'unknown'
+    index.refresh(version, lambda since_ms: _fetch_scenes_since(get_combined_roi(asset_id), since_ms))
+    return index
+
+@single_flight('available_dates')
+@ensure_ee_initialized
 def get_available_dates_for_asset(start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20):
     """Fetch available dates for Sentinel-2 imagery for a given asset and date range."""
+    try:
+        index = get_scene_index(asset_id)
+        if index.covers(start_date):
+            return index.dates(start_date, end_date, cloud_cover)
+    except Exception as e:
+        logging.warning(f"Scene index unavailable for asset {asset_id}, querying Earth Engine: {e}")
+
     roi = get_combined_roi(asset_id)
     collection = filter_collection(roi, start_date, end_date, cloud_cover)
     try:
@@ -147,6 +253,22 @@ def apply_water_mask(image: ee.Image) -> ee.Image:
     water_mask = mndwi.gt(0)  # Keep only water pixels
     return image.updateMask(water_mask)
 
+def _stretch_from_percentiles(percentiles: dict, band_name: str, parameter: str):
+    """Returns the (min, max) stretch from p5/p95 percentiles, or [-1, 1] if they are missing."""
+    min_val = percentiles.get(f'{band_name}_p5')
+    max_val = percentiles.get(f'{band_name}_p95')
+
+    if min_val is None or max_val is None:
+        logging.warning(f"Could not calculate percentiles for {parameter}. Using default range [-1, 1].")
+        return -1, 1
+
+    stretch_min = float(min_val)
+    stretch_max = float(max_val)
+    if stretch_min == stretch_max:
+        stretch_min -= 0.01
+        stretch_max += 0.01
+    return stretch_min, stretch_max
+
 @ensure_ee_initialized
 def get_visualization_and_params(image: ee.Image, parameter: str, roi: ee.Geometry):
     """
@@ -156,21 +278,11 @@ def get_visualization_and_params(image: ee.Image, parameter: str, roi: ee.Geomet
     masked_image = image.clip(roi)
     
     # Determine the band name for processing
-    if parameter == 'chlorophyll':
-        processed_band_name = "chlorophyll_nd"
-        processed_image = masked_image.normalizedDifference(['B5', 'B4']).rename(processed_band_name)
-    elif parameter == 'turbidity':
-        processed_band_name = "turbidity_nd"
-        processed_image = masked_image.normalizedDifference(['B4', 'B3']).rename(processed_band_name)
-    elif parameter == 'tss':
-        processed_band_name = "tss_nd"
-        processed_image = masked_image.normalizedDifference(['B2', 'B8']).rename(processed_band_name)
-    else:
+    if parameter not in PARAMETER_BANDS:
         logging.warning(f"Invalid parameter '{parameter}' received.")
         return None, None
-
-    stretch_min, stretch_max = -1, 1
-    palette = ["blue", "green", "yellow", "red"]
+    processed_band_name = f"{parameter}_nd"
+    processed_image = masked_image.normalizedDifference(PARAMETER_BANDS[parameter]).rename(processed_band_name)
 
     try:
         percentiles = processed_image.select(processed_band_name).reduceRegion(
@@ -179,29 +291,26 @@ def get_visualization_and_params(image: ee.Image, parameter: str, roi: ee.Geomet
             scale=30,
             maxPixels=1e9
         ).getInfo()
-
-        min_val = percentiles.get(f'{processed_band_name}_p5')
-        max_val = percentiles.get(f'{processed_band_name}_p95')
-
-        if min_val is not None and max_val is not None:
-            stretch_min = float(min_val)
-            stretch_max = float(max_val)
-            if stretch_min == stretch_max:
-                stretch_min -= 0.01
-                stretch_max += 0.01
-        else:
-            logging.warning(f"Could not calculate percentiles for {parameter}. Using default range [-1, 1].")
+        stretch_min, stretch_max = _stretch_from_percentiles(percentiles, processed_band_name, parameter)
 
     except Exception as e:
         logging.exception(f"Error calculating percentiles for {parameter}: {e}. Using default range [-1, 1].")
+        stretch_min, stretch_max = -1, 1
 
     vis_image = processed_image.visualize(
-        bands=[processed_band_name], min=stretch_min, max=stretch_max, palette=palette
+        bands=[processed_band_name], min=stretch_min, max=stretch_max, palette=PARAMETER_PALETTE
     )
     
     stretch_params = {'min': stretch_min, 'max': stretch_max}
     return vis_image, stretch_params
 
+@ensure_ee_initialized
+def _get_tile_url(vis_image: ee.Image) -> str:
+    """Requests a map ID for a visualized image and returns its tile URL template."""
+    return vis_image.getMapId()['tile_fetcher'].url_format
+
+@single_flight('composite')
+@cached_tile_result('composite', version=_asset_version_of)
 @ensure_ee_initialized
 def get_composite_tiles_for_asset(parameter: str, start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20):
     """
@@ -219,6 +328,8 @@ def get_composite_tiles_for_asset(parameter: str, start_date: str, end_date: str
     tile_url = vis_image.getMapId()['tile_fetcher'].url_format
     return tile_url, stretch_params
 
+@single_flight('specific_date')
+@cached_tile_result('specific_date', version=_asset_version_of)
 @ensure_ee_initialized
 def get_specific_date_tiles_for_asset(parameter: str, date: str, asset_id: str, cloud_cover: int = 20):
     """Generate tiles for a specific parameter and date for a given EE asset."""
@@ -227,20 +338,99 @@ def get_specific_date_tiles_for_asset(parameter: str, date: str, asset_id: str,
     next_day_str = next_day.strftime('%Y-%m-%d')
     
     collection = filter_collection(roi, date, next_day_str, cloud_cover)
-    
-    count = collection.size().getInfo()
-    if count == 0:
+
+    if parameter not in PARAMETER_BANDS:
+        logging.warning(f"Invalid parameter '{parameter}' received.")
+        return None, None
+    band_name = f"{parameter}_nd"
+    index_image = collection.first().clip(roi).normalizedDifference(PARAMETER_BANDS[parameter]).rename(band_name)
+    percentiles = index_image.reduceRegion(
+        reducer=ee.Reducer.percentile([5, 95]),
+        geometry=roi,
+        scale=30,
+        maxPixels=1e9
+    )
+
+    # The image count and the percentile stretch come back in one round trip; the
+    # stretch is only evaluated when the date has an image
+    count = collection.size()
+    try:
+        info = ee.Dictionary({'count': count, 'percentiles': ee.Algorithms.If(count.gt(0), percentiles, None)}).getInfo()
+    except Exception as e:
+        logging.exception(f"Error calculating percentiles for {parameter}: {e}. Using default range [-1, 1].")
+        try:
+            info = {'count': count.getInfo(), 'percentiles': None}
+        except Exception as e:
+            logging.error(f"Could not count the images for parameter '{parameter}' on date {date}: {e}")
+            return None, None
+
+    if info['count'] == 0:
         logging.warning(f"No image found for parameter '{parameter}' on date {date} for asset {asset_id}")
         return None, None # No image found for this date
-        
-    image = collection.first()
-    vis_image, stretch_params = get_visualization_and_params(image, parameter, roi)
 
-    if vis_image is None:
-        return None, None # Visualization failed
-        
+    stretch_min, stretch_max = _stretch_from_percentiles(info['percentiles'] or {}, band_name, parameter)
+    vis_image = index_image.visualize(bands=[band_name], min=stretch_min, max=stretch_max, palette=PARAMETER_PALETTE)
     tile_url = vis_image.getMapId()['tile_fetcher'].url_format
-    return tile_url, stretch_params
+    return tile_url, {'min': stretch_min, 'max': stretch_max}
+
+@single_flight('all_parameters')
+@cached_tile_result('all_parameters', version=_asset_version_of)
+@ensure_ee_initialized
+def get_all_parameter_tiles_for_asset(start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20, date: str = None):
+    """
+    Generates tiles for every water quality parameter in one pass.
+    Uses the composite (median) over the date range, or the image of a specific date if given.
+    All index bands are stretched with a single percentile reduceRegion and the map IDs are
+    requested concurrently. Returns {parameter: {tile_url, legend_min, legend_max}}, or None
+    if there is no imagery.
+    """
+    roi = get_combined_roi(asset_id)
+    if date:
+        next_day = datetime.datetime.strptime(date, '%Y-%m-%d') + datetime.timedelta(days=1)
+        collection = filter_collection(roi, date, next_day.strftime('%Y-%m-%d'), cloud_cover)
+        if collection.size().getInfo() == 0:
+            logging.warning(f"No image found on date {date} for asset {asset_id}")
+            return None
+        image = collection.first()
+    else:
+        image = filter_collection(roi, start_date, end_date, cloud_cover).median()
+
+    masked_image = image.clip(roi)
+    band_names = [f"{parameter}_nd" for parameter in PARAMETER_BANDS]
+    index_image = ee.Image.cat([
+        masked_image.normalizedDifference(bands).rename(f"{parameter}_nd")
+        for parameter, bands in PARAMETER_BANDS.items()
+    ])
+
+    try:
+        percentiles = index_image.reduceRegion(
+            reducer=ee.Reducer.percentile([5, 95]),
+            geometry=roi,
+            scale=30,
+            maxPixels=1e9
+        ).getInfo()
+    except Exception as e:
+        logging.exception(f"Error calculating percentiles: {e}. Using default range [-1, 1].")
+        percentiles = {}
+
+    stretches = {
+        parameter: _stretch_from_percentiles(percentiles, band_name, parameter)
+        for parameter, band_name in zip(PARAMETER_BANDS, band_names)
+    }
+    vis_images = {
+        parameter: index_image.visualize(bands=[band_name], min=stretches[parameter][0], max=stretches[parameter][1], palette=PARAMETER_PALETTE)
+        for parameter, band_name in zip(PARAMETER_BANDS, band_names)
+    }
+
+    tile_urls = fan_out(_get_tile_url, [(vis_image,) for vis_image in vis_images.values()])
+    return {
+        parameter: {
+            'tile_url': tile_url,
+            'legend_min': stretches[parameter][0],
+            'legend_max': stretches[parameter][1]
+        }
+        for parameter, tile_url in zip(vis_images, tile_urls)
+    }
 
 @ensure_ee_initialized
 def _prepare_parameter_image(image: ee.Image, parameter: str):
@@ -255,52 +445,131 @@ def _prepare_parameter_image(image: ee.Image, parameter: str):
         return None # Return None if the parameter is invalid
         
     date = ee.Date(image.get('system:time_start')).format('YYYY-MM-dd')
-    return processed.set('date', date)
+    return processed.set({'date': date, 'system:time_start': image.get('system:time_start')})
 
 @ensure_ee_initialized
-def get_parameter_values_per_polygon(parameter: str, start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20):
+def _reduce_polygons_over_collection(image_collection: ee.ImageCollection, features: ee.FeatureCollection, band_names: list):
+    """
+    Reduces every polygon against every image of the collection in a single request.
+    Returns the polygon names and one row (Name, date, time, scene_id, band means) per
+    polygon and image; scene_id is None unless the image sets it.
+    """
+    # A single-band mean outputs 'mean'; rename it so rows always carry the band names
+    reducer = ee.Reducer.mean() if len(band_names) > 1 else ee.Reducer.mean().setOutputs(band_names)
+
+    def reduce_image(image):
+        reduced = image.reduceRegions(collection=features, reducer=reducer, scale=30)
+        return reduced.map(lambda f: ee.Feature(None, {
+            'Name': f.get('Name'),
+            'date': image.get('date'),
+            'time': image.get('system:time_start'),
+            'scene_id': image.get('scene_id'),
+            **{band: f.get(band) for band in band_names}
+        }))
+
+    flattened = image_collection.map(reduce_image).flatten()
+    result = ee.Dictionary({
+        'names': features.aggregate_array('Name'),
+        'rows': flattened
+    }).getInfo()
+    rows = [item['properties'] for item in result['rows']['features']]
+    return result['names'], rows
+
+@ensure_ee_initialized
+def _prepare_all_parameters_image(image: ee.Image) -> ee.Image:
+    """Helper to calculate every parameter as one multi-band image and set the date."""
+    processed = ee.Image.cat([
+        image.normalizedDifference(bands).rename(parameter) for parameter, bands in PARAMETER_BANDS.items()
+    ])
+    date = ee.Date(image.get('system:time_start')).format('YYYY-MM-dd')
+    return processed.set({
+        'date': date,
+        'system:time_start': image.get('system:time_start'),
+        'scene_id': image.get('system:index')
+    })
+
+@ensure_ee_initialized
+def get_all_parameter_means_per_polygon(start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20) -> list:
+    """
+    Computes the mean of every water quality parameter for every polygon and scene in the
+    date range with a single multi-band reduceRegions request.
+    Returns rows of {Name, date, time, scene_id, chlorophyll, turbidity, tss}; missing
+    means are None.
+    """
+    asset = load_ee_asset(asset_id)
+    roi = get_combined_roi(asset_id)
+    collection = filter_collection(roi, start_date, end_date, cloud_cover)
+    processed_collection = collection.map(_prepare_all_parameters_image)
+    _, rows = _reduce_polygons_over_collection(processed_collection, asset.select(['Name']), list(PARAMETER_BANDS))
+    return rows
+
+@ensure_ee_initialized
+def _all_parameter_means_for_scene_chunk(asset_id: str, scenes: list) -> list:
+    asset = load_ee_asset(asset_id)
+    times = [t for t, _ in scenes]
+    collection = ee.ImageCollection(S2_COLLECTION_ID) \
+        .filterBounds(get_combined_roi(asset_id)) \
+        .filterDate(ee.Date(min(times)), ee.Date(max(times) + 1)) \
+        .filter(ee.Filter.inList('system:index', [scene_id for _, scene_id in scenes]))
+    processed_collection = collection.map(_prepare_all_parameters_image)
+    _, rows = _reduce_polygons_over_collection(processed_collection, asset.select(['Name']), list(PARAMETER_BANDS))
+    return rows
+
+@ensure_ee_initialized
+def get_all_parameter_means_for_scenes(scenes: list, asset_id: str) -> list:
+    """
+    Computes the mean of every water quality parameter for every polygon over the given
+    (time_ms, scene_id) scenes only. Scenes are reduced SCENES_PER_REQUEST at a time in
+    parallel on the EE executor. Returns rows like get_all_parameter_means_per_polygon.
+    """
+    scenes = sorted(scenes)
+    if not scenes:
+        return []
+    chunks = [scenes[i:i + SCENES_PER_REQUEST] for i in range(0, len(scenes), SCENES_PER_REQUEST)]
+    outputs = fan_out(_all_parameter_means_for_scene_chunk, [(asset_id, chunk) for chunk in chunks])
+    return [row for rows in outputs for row in rows]
+
+@single_flight('parameter_values')
+@ensure_ee_initialized
+def get_parameter_values_per_polygon(parameter: str, start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20, chunk_size: int = POLYGON_BATCH_CHUNK_SIZE):
     """
     Fetches time-series data for a parameter for each polygon in the specified EE asset.
     The output is a dictionary where keys are polygon identifiers.
+    All polygons are reduced in one request; with a positive chunk_size, the asset is split
+    into chunks of that many polygons that are reduced in parallel on the EE executor.
     """
     try:
         asset = load_ee_asset(asset_id)
 
-        feature_names = asset.aggregate_array('Name').getInfo() 
-        
         # Get the combined geometry for efficient initial filtering
         combined_roi = get_combined_roi(asset_id)
         collection = filter_collection(combined_roi, start_date, end_date, cloud_cover)
         
         processed_collection = collection.map(lambda img: _prepare_parameter_image(img, parameter))
+        features = asset.select(['Name'])
+
+        if chunk_size and chunk_size > 0:
+            total = features.size().getInfo()
+            chunks = [ee.FeatureCollection(features.toList(chunk_size, offset)) for offset in range(0, total, chunk_size)]
+            logging.info(f"Reducing {total} polygons in {len(chunks)} chunk(s) of up to {chunk_size}")
+            outputs = fan_out(
+                _reduce_polygons_over_collection,
+                [(processed_collection, chunk, [parameter]) for chunk in chunks]
+            )
+        else:
+            outputs = [_reduce_polygons_over_collection(processed_collection, features, [parameter])]
 
         results = {}
-
-        for name in feature_names:
-            # Filter the asset to get the geometry of the current polygon
-            feature = asset.filter(ee.Filter.eq('Name', name)).first()
-            geometry = feature.geometry()
-            
-            def reduce_region(image):
-                """Closure to reduce each image in the collection over the polygon's geometry."""
-                stats = image.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=geometry,
-                    scale=30, # Scale for Sentinel-2
-                    maxPixels=1e9
-                ).get(parameter)
-                return ee.Feature(None, {'value': stats, 'date': image.get('date')})
-
-            time_series = processed_collection.map(reduce_region).getInfo()
-            
-            # Clean and format the results
-            polygon_values = [
-                item['properties'] for item in time_series['features'] 
-                if item['properties'].get('date') and item['properties'].get('value') is not None
-            ]
+        for names, rows in outputs:
+            for name in names:
+                results.setdefault(name, [])
+            for row in rows:
+                # Clean and format the results
+                if row.get('date') and row.get(parameter) is not None:
+                    results.setdefault(row['Name'], []).append({'date': row['date'], 'value': row[parameter]})
+
+        for polygon_values in results.values():
             polygon_values.sort(key=lambda x: x['date']) # Sort by date
-            
-            results[name] = polygon_values
 
         return results
 
@@ -319,6 +588,8 @@ def create_rgb_visualization(image: ee.Image) -> ee.Image:
     }
     return image.visualize(**rgb_vis)
 
+@single_flight('composite_rgb')
+@cached_tile_result('composite_rgb', version=_asset_version_of)
 @ensure_ee_initialized
 def get_composite_rgb_tiles_for_asset(start_date: str, end_date: str, asset_id: str, cloud_cover: int = 20) -> str:
     """Generate composite RGB visualization tiles for a given EE asset."""
@@ -329,6 +600,8 @@ def get_composite_rgb_tiles_for_asset(start_date: str, end_date: str, asset_id:
     tile_url = rgb_image.getMapId()['tile_fetcher'].url_format
     return tile_url
 
+@single_flight('specific_date_rgb')
+@cached_tile_result('specific_date_rgb', version=_asset_version_of)
 @ensure_ee_initialized
 def get_specific_date_rgb_tiles_for_asset(date: str, asset_id: str, cloud_cover: int = 20) -> str:
     """Generate specific date RGB visualization tiles for a given EE asset."""
@@ -338,11 +611,12 @@ def get_specific_date_rgb_tiles_for_asset(date: str, asset_id: str, cloud_cover:
     
     collection = filter_collection(roi, date, next_day_str, cloud_cover)
     
+    # Only request a map ID when the date has an image
     count = collection.size().getInfo()
     if count == 0:
         logging.warning(f"No image found for date {date} and asset {asset_id}")
         return None
-        
+
     image = collection.first().clip(roi) # Explicitly clip the image
     rgb_image = create_rgb_visualization(image)
     tile_url = rgb_image.getMapId()['tile_fetcher'].url_format
@@ -375,6 +649,8 @@ def create_geometry_from_coordinates(coordinates_json: str):
         logging.error(f"Error creating geometry from coordinates: {e}")
         raise
 
+@single_flight('composite_rgb_polygons')
+@cached_tile_result('composite_rgb_polygons')
 @ensure_ee_initialized
 def get_composite_rgb_tiles_for_polygons(start_date: str, end_date: str, coordinates_list: list, cloud_cover: int = 20) -> str:
     """
@@ -388,6 +664,8 @@ def get_composite_rgb_tiles_for_polygons(start_date: str, end_date: str, coordin
     tile_url = rgb_image.getMapId()['tile_fetcher'].url_format
     return tile_url
 
+@single_flight('specific_date_rgb_polygons')
+@cached_tile_result('specific_date_rgb_polygons')
 @ensure_ee_initialized
 def get_specific_date_rgb_tiles_for_polygons(date: str, coordinates_list: list, cloud_cover: int = 20) -> str:
     """
@@ -408,4 +686,38 @@ def get_specific_date_rgb_tiles_for_polygons(date: str, coordinates_list: list,
     image = collection.first().clip(roi)
     rgb_image = create_rgb_visualization(image)
     tile_url = rgb_image.getMapId()['tile_fetcher'].url_format
-    return tile_url
\ No newline at end of file
+    return tile_url
+
+# --- Tile proxy layers ---
+def _tile_url_of(result):
+    """The tile URL of a service result, which is either the URL or (URL, stretch)."""
+    return result[0] if isinstance(result, tuple) else result
+
+def _all_parameters_tile_url(args: dict):
+    parameter = args.pop('parameter')
+    layers = get_all_parameter_tiles_for_asset(**args)
+    return layers[parameter]['tile_url'] if layers and parameter in layers else None
+
+def _invalidate_all_parameters(args: dict):
+    args.pop('parameter')
+    get_all_parameter_tiles_for_asset.invalidate(**args)
+
+def _register_tile_layers():
+    """Lets the tile proxy resolve layers built by the service functions above."""
+    layer_functions = {
+        'composite': get_composite_tiles_for_asset,
+        'specific_date': get_specific_date_tiles_for_asset,
+        'composite_rgb': get_composite_rgb_tiles_for_asset,
+        'specific_date_rgb': get_specific_date_rgb_tiles_for_asset,
+        'composite_rgb_polygons': get_composite_rgb_tiles_for_polygons,
+        'specific_date_rgb_polygons': get_specific_date_rgb_tiles_for_polygons,
+    }
+    for kind, func in layer_functions.items():
+        register_layer_kind(
+            kind,
+            lambda args, func=func: _tile_url_of(func(**args)),
+            lambda args, func=func: func.invalidate(**args)
+        )
+    register_layer_kind('all_parameters', _all_parameters_tile_url, _invalidate_all_parameters)
+
+_register_tile_layers()
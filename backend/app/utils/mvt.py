@@ -0,0 +1,210 @@
+"""
+Minimal Mapbox Vector Tile (MVT 2.1) support for polygon layers, in pure Python.
+
+Covers what the FLA tiles need: Web Mercator projection, Douglas-Peucker
+simplification, clipping to a buffered tile, quantization to the tile grid, and the
+protobuf encoding of polygon features with properties.
+"""
+
+import math
+import struct
+
+EXTENT = 4096
+
+# Geometry commands
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POLYGON = 3
+
+
+# --- Projection ---
+def lonlat_to_world(lon: float, lat: float) -> tuple:
+    """Projects a WGS84 coordinate to Web Mercator world coordinates in [0, 1] (y down)."""
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """World-coordinate bounds (min_x, min_y, max_x, max_y) of a tile."""
+    size = 1.0 / (1 << z)
+    return x * size, y * size, (x + 1) * size, (y + 1) * size
+
+
+# --- Geometry ---
+def simplify(points: list, tolerance: float) -> list:
+    """Douglas-Peucker simplification of a closed or open line; keeps both end points."""
+    if len(points) <= 3 or tolerance <= 0:
+        return points
+    sq_tolerance = tolerance * tolerance
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first]
+        bx, by = points[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        max_dist, index = 0.0, None
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length_sq == 0:
+                dist = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+                dist = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > sq_tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def ring_area(ring: list) -> float:
+    """Signed area (shoelace); positive for clockwise rings in y-down coordinates."""
+    area = 0.0
+    for i in range(len(ring)):
+        x1, y1 = ring[i - 1]
+        x2, y2 = ring[i]
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+def bbox(ring: list) -> tuple:
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def _clip_edge(ring, inside, intersect):
+    output = []
+    if not ring:
+        return output
+    previous = ring[-1]
+    for current in ring:
+        if inside(current):
+            if not inside(previous):
+                output.append(intersect(previous, current))
+            output.append(current)
+        elif inside(previous):
+            output.append(intersect(previous, current))
+        previous = current
+    return output
+
+def clip_ring(ring: list, min_x: float, min_y: float, max_x: float, max_y: float) -> list:
+    """Sutherland-Hodgman clipping of a ring (without closing point) to a rectangle."""
+    def at_x(x):
+        return lambda a, b: (x, a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0]))
+
+    def at_y(y):
+        return lambda a, b: (a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1]), y)
+
+    ring = _clip_edge(ring, lambda p: p[0] >= min_x, at_x(min_x))
+    ring = _clip_edge(ring, lambda p: p[0] <= max_x, at_x(max_x))
+    ring = _clip_edge(ring, lambda p: p[1] >= min_y, at_y(min_y))
+    ring = _clip_edge(ring, lambda p: p[1] <= max_y, at_y(max_y))
+    return ring
+
+def quantize_ring(ring: list, bounds: tuple, extent: int = EXTENT) -> list:
+    """Maps a world-coordinate ring to integer tile coordinates, dropping repeated points."""
+    min_x, min_y, max_x, max_y = bounds
+    scale_x = extent / (max_x - min_x)
+    scale_y = extent / (max_y - min_y)
+    output = []
+    for x, y in ring:
+        point = (int(round((x - min_x) * scale_x)), int(round((y - min_y) * scale_y)))
+        if not output or output[-1] != point:
+            output.append(point)
+    if len(output) > 1 and output[0] == output[-1]:
+        output.pop()
+    return output
+
+
+# --- Protobuf encoding ---
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+def _bytes_field(field: int, data: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(data)) + data
+
+def _packed(field: int, values: list) -> bytes:
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(6, 0) + _varint(_zigzag(value)) if value < 0 else _key(5, 0) + _varint(value)
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+def encode_polygon(rings: list) -> list:
+    """
+    Encodes quantized rings as MVT geometry commands. Rings must already be oriented:
+    exterior rings with positive area, interior rings with negative area.
+    """
+    commands = []
+    cursor_x = cursor_y = 0
+    for ring in rings:
+        x, y = ring[0]
+        commands.append((MOVE_TO & 0x7) | (1 << 3))
+        commands += [_zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+        cursor_x, cursor_y = x, y
+        commands.append((LINE_TO & 0x7) | ((len(ring) - 1) << 3))
+        for x, y in ring[1:]:
+            commands += [_zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+            cursor_x, cursor_y = x, y
+        commands.append((CLOSE_PATH & 0x7) | (1 << 3))
+    return commands
+
+def encode_layer(name: str, features: list, extent: int = EXTENT) -> bytes:
+    """
+    Encodes a layer of polygon features, each given as {'id', 'properties', 'geometry'}
+    where geometry is the output of encode_polygon. Returns the tile bytes (one layer).
+    """
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+    for feature in features:
+        tags = []
+        for key, value in feature['properties'].items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags += [key_index[key], value_index[value_key]]
+
+        body = b''
+        if feature.get('id') is not None:
+            body += _key(1, 0) + _varint(feature['id'])
+        body += _packed(2, tags)
+        body += _key(3, 0) + _varint(POLYGON)
+        body += _packed(4, feature['geometry'])
+        encoded_features.append(_bytes_field(2, body))
+
+    layer = _key(15, 0) + _varint(2) + _bytes_field(1, name.encode('utf-8'))
+    layer += b''.join(encoded_features)
+    layer += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes_field(4, _encode_value(value)) for value in values)
+    layer += _key(5, 0) + _varint(extent)
+    return _bytes_field(3, layer)
@@ -0,0 +1,175 @@
+"""
+Bounded worker pool for bcrypt hashing and verification.
+
+bcrypt spends tens to hundreds of milliseconds of CPU per call, with the GIL released,
+so running it on a small pool sized to the cores keeps a burst of logins from tying up
+every request thread. Admission control caps the number of queued hashes. Beyond it,
+calls fail fast with HashingBusy and the route answers 429 with Retry-After. A call
+that waits longer than HASH_TIMEOUT_SECONDS fails the same way. Its hash keeps its
+slot until it finishes, so abandoned work still counts against the bound.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', os.cpu_count() or 2))
+HASH_MAX_QUEUE = int(os.getenv('HASH_MAX_QUEUE', HASH_WORKERS * 4))
+HASH_TIMEOUT_SECONDS = float(os.getenv('HASH_TIMEOUT_SECONDS', 10))
+LATENCY_SAMPLES = 512
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent password operations")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Hashing pool with a bounded queue and latency metrics."""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE, rounds: int = BCRYPT_LOG_ROUNDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds spent hashing
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hasher')
+            return self._executor
+
+    def reset_after_fork(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._pending = self._running = 0
+
+    def _retry_after(self) -> int:
+        with self._lock:
+            latencies = list(self._latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.25
+        # Time for the pool to drain the current queue, rounded up to whole seconds
+        return max(1, int(average * (self.max_queue + self.workers) / self.workers + 0.999))
+
+    def _timed(self, func, *args):
+        with self._lock:
+            self._running += 1
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - started)
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy(self._retry_after())
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._get_executor().submit(self._timed, func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the work finishes, not when the caller stops waiting
+        future.add_done_callback(self._release)
+
+        try:
+            return future.result(timeout=HASH_TIMEOUT_SECONDS)
+        except FuturesTimeoutError:
+            future.cancel()  # Frees the slot now if the hash hasn't started
+            with self._lock:
+                self._timed_out += 1
+            raise HashingBusy(self._retry_after())
+
+    def hash(self, password: str) -> str:
+        """Returns a new bcrypt hash of password at the configured cost."""
+        return self._run(
+            lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+        )
+
+    def check(self, password_hash: str, password: str) -> bool:
+        """Whether password matches password_hash."""
+        if not password_hash or password is None:
+            return False
+        return self._run(lambda: bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether the hash was made with a different cost factor than the configured one."""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def check_and_upgrade(self, subject, password: str) -> bool:
+        """
+        Verifies password against subject.password. On success, a hash with an outdated
+        cost factor is replaced on the subject; the caller commits.
+        """
+        if not self.check(subject.password, password):
+            return False
+        if self.needs_rehash(subject.password):
+            try:
+                subject.password = self.hash(password)
+                logging.info(f"Rehashed password of {type(subject).__name__} with cost {self.rounds}")
+            except HashingBusy:
+                pass  # Upgrade on a later login
+        return True
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            queued = max(0, self._pending - self._running)
+            metrics = {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'rounds': self.rounds,
+                'running': self._running,
+                'queued': queued,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+            }
+        if latencies:
+            metrics['latency_ms'] = {
+                'avg': round(sum(latencies) / len(latencies) * 1000, 1),
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return metrics
+
+
+password_hasher = PasswordHasher()
+
+os.register_at_fork(after_in_child=password_hasher.reset_after_fork)
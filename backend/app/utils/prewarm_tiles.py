@@ -0,0 +1,222 @@
+"""
+Pre-warms the tile layers the dashboard asks for first.
+
+Each run checks the scene index for dates that weren't there on the previous run.
+It then builds the map IDs and legend stretches of every parameter and of RGB for the
+dashboard's default view (composite from DEFAULT_START_DATE to today at
+DEFAULT_CLOUD_COVER) and for the new and newest dates. Layers are rebuilt when new
+imagery arrives and before their cached map ID expires. With --pyramid, the tiles
+covering the FLAs at PREWARM_PYRAMID_ZOOMS are also fetched into the tile proxy's
+disk cache.
+
+The map IDs are shared with the API through the tile result cache, so this only takes
+effect with TILE_CACHE_BACKEND set to sqlite (same host) or redis. Run it with
+--interval, or schedule it with a period below PREWARM_REFRESH_MARGIN_SECONDS.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+try:
+    from app.utils.isdaan_ee_service import get_scene_index
+    from app.utils.threshold_engine import WATER_QUALITY_PARAMETERS
+    from app.utils.tile_cache import TILE_CACHE_BACKEND, TILE_CACHE_TTL_SECONDS
+    from app.utils.tile_proxy import register_layer, resolve_layer, get_tile, TileProxyError
+    from app.utils.fla_tiles import get_fla_tile_index
+    from app.config import Config
+except ImportError as e:
+    print(f"Import Error: {e}. Ensure the script is run from a context where the models, ee_service, and config are accessible.")
+    print("You might need to adjust PYTHONPATH or run as a module (e.g. python -m app.utils.prewarm_tiles).")
+    exit(1)
+
+# --- Configuration ---
+ISDAAN_FLAS_ASSET_ID = os.getenv("ISDAAN_FLAS_ASSET_ID")
+POLYGON_COORDINATES_JSON = os.getenv("POLYGON_COORDINATES_JSON")
+# Defaults of the dashboard (frontend/src/pages/Dashboard.jsx). The start date is the
+# browser's local date; PREWARM_CLIENT_TIMEZONE is the time zone of its users
+DEFAULT_START_DATE = os.getenv("PREWARM_START_DATE", "2025-01-01")
+PREWARM_CLIENT_TIMEZONE = os.getenv("PREWARM_CLIENT_TIMEZONE", "Asia/Manila")
+DEFAULT_CLOUD_COVER = int(os.getenv("PREWARM_CLOUD_COVER", 20))
+# The dashboard opens at zoom 9.7, which loads zoom 10 tiles
+PREWARM_PYRAMID_ZOOMS = [int(z) for z in os.getenv("PREWARM_PYRAMID_ZOOMS", "9,10").split(",") if z.strip()]
+PREWARM_MAX_NEW_DATES = int(os.getenv("PREWARM_MAX_NEW_DATES", 3))
+PREWARM_TILE_WORKERS = int(os.getenv("PREWARM_TILE_WORKERS", 8))
+# Layers whose map ID would expire within this margin (plus the interval) are rebuilt
+PREWARM_REFRESH_MARGIN_SECONDS = int(os.getenv("PREWARM_REFRESH_MARGIN_SECONDS", 60 * 60))
+PREWARM_INTERVAL_SECONDS = int(os.getenv("PREWARM_INTERVAL_SECONDS", 0))
+STATE_PATH = os.path.join(Config.CACHE_DIR, 'prewarm_tiles.json')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def load_state() -> dict:
+    """Returns {'dates': dates seen on the last run, 'layers': {layer_key: built at}}."""
+    try:
+        with open(STATE_PATH) as f:
+            state = json.load(f)
+        return {'dates': state.get('dates', []), 'layers': state.get('layers', {})}
+    except (OSError, ValueError):
+        return {'dates': [], 'layers': {}}
+
+def save_state(state: dict):
+    now = time.time()
+    state['layers'] = {key: built_at for key, built_at in state['layers'].items() if now - built_at < TILE_CACHE_TTL_SECONDS}
+    try:
+        os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+        tmp_path = f"{STATE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, STATE_PATH)
+    except OSError as e:
+        logging.warning(f"Could not save pre-warm state: {e}")
+
+def client_start_date() -> str:
+    """
+    The start date as the dashboard sends it. It serializes the local midnight of
+    DEFAULT_START_DATE with toISOString(), which gives the UTC date, so east of UTC it
+    is the day before.
+    """
+    local_midnight = datetime.strptime(DEFAULT_START_DATE, '%Y-%m-%d').replace(tzinfo=ZoneInfo(PREWARM_CLIENT_TIMEZONE))
+    return local_midnight.astimezone(timezone.utc).strftime('%Y-%m-%d')
+
+def default_view_layers(start_date: str, end_date: str) -> list:
+    """(label, kind, args, pre-render tiles) of the layers of the dashboard's default view."""
+    args = {'start_date': start_date, 'end_date': end_date, 'cloud_cover': DEFAULT_CLOUD_COVER}
+    layers = [
+        (f"composite {parameter}", 'composite', {'parameter': parameter, 'asset_id': ISDAAN_FLAS_ASSET_ID, **args}, True)
+        for parameter in WATER_QUALITY_PARAMETERS
+    ]
+    # The dashboard's RGB layer is the one clipped to the polygons
+    if POLYGON_COORDINATES_JSON:
+        layers.append(("composite RGB (polygons)", 'composite_rgb_polygons', {'coordinates_list': POLYGON_COORDINATES_JSON, **args}, True))
+    return layers
+
+def date_layers(date: str, pyramid: bool) -> list:
+    """(label, kind, args, pre-render tiles) of the layers shown for a specific date."""
+    args = {'date': date, 'cloud_cover': DEFAULT_CLOUD_COVER}
+    layers = [
+        (f"{date} {parameter}", 'specific_date', {'parameter': parameter, 'asset_id': ISDAAN_FLAS_ASSET_ID, **args}, pyramid)
+        for parameter in WATER_QUALITY_PARAMETERS
+    ]
+    if POLYGON_COORDINATES_JSON:
+        layers.append((f"{date} RGB (polygons)", 'specific_date_rgb_polygons', {'coordinates_list': POLYGON_COORDINATES_JSON, **args}, pyramid))
+    return layers
+
+def warm_layer(label: str, kind: str, args: dict, state: dict, refresh_margin: float, force: bool = False):
+    """Builds the layer's map ID if it is missing or due; returns its layer key, or None without imagery."""
+    layer_key = register_layer(kind, **args)
+    built_at = state['layers'].get(layer_key, 0)
+    refresh = force or time.time() - built_at >= TILE_CACHE_TTL_SECONDS - refresh_margin
+
+    started = time.perf_counter()
+    try:
+        resolve_layer(layer_key, refresh=refresh)
+    except TileProxyError as e:
+        logging.info(f"Skipping {label}: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Failed to build {label}: {e}")
+        return None
+
+    if refresh:
+        state['layers'][layer_key] = time.time()
+        logging.info(f"Built {label} in {time.perf_counter() - started:.1f}s")
+    return layer_key
+
+def roi_tiles(zooms: list) -> list:
+    """(z, x, y) of every tile covering the bounding box of the FLAs at the given zooms."""
+    features = get_fla_tile_index(ISDAAN_FLAS_ASSET_ID).features
+    if not features:
+        return []
+    min_x = min(feature['bbox'][0] for feature in features)
+    min_y = min(feature['bbox'][1] for feature in features)
+    max_x = max(feature['bbox'][2] for feature in features)
+    max_y = max(feature['bbox'][3] for feature in features)
+
+    tiles = []
+    for z in zooms:
+        n = 1 << z
+        for x in range(int(min_x * n), min(n - 1, int(max_x * n)) + 1):
+            for y in range(int(min_y * n), min(n - 1, int(max_y * n)) + 1):
+                tiles.append((z, x, y))
+    return tiles
+
+def prerender_tiles(layer_keys: list, zooms: list):
+    """Fetches the FLA-covering tiles of every layer into the tile proxy's disk cache."""
+    tiles = roi_tiles(zooms)
+    jobs = [(layer_key, *tile) for layer_key in layer_keys for tile in tiles]
+    if not jobs:
+        return
+
+    def fetch(job):
+        try:
+            get_tile(*job)
+            return True
+        except Exception as e:
+            logging.warning(f"Could not pre-render tile {job[1]}/{job[2]}/{job[3]} of layer {job[0]}: {e}")
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PREWARM_TILE_WORKERS, thread_name_prefix='prewarm') as executor:
+        fetched = sum(executor.map(fetch, jobs))
+    logging.info(f"Pre-rendered {fetched}/{len(jobs)} tile(s) of {len(layer_keys)} layer(s) at zoom {zooms} in {time.perf_counter() - started:.1f}s")
+
+def prewarm_tiles(pyramid: bool = False, refresh_margin: float = PREWARM_REFRESH_MARGIN_SECONDS):
+    """Runs one pre-warm pass."""
+    logging.info("Starting tile pre-warm...")
+    state = load_state()
+
+    # Dates as the dashboard sends them: its range ends today (UTC, from toISOString()),
+    # exclusive, like its available-dates query
+    start_date = client_start_date()
+    end_date = datetime.now(timezone.utc).date().strftime('%Y-%m-%d')
+    dates = get_scene_index(ISDAAN_FLAS_ASSET_ID).dates(start_date, end_date, DEFAULT_CLOUD_COVER)
+    seen = set(state['dates'])
+    new_dates = [date for date in dates if date not in seen][-PREWARM_MAX_NEW_DATES:]
+    if new_dates:
+        logging.info(f"New imagery dates: {', '.join(new_dates)}")
+
+    # New imagery changes the composite, so the default view is rebuilt along with it
+    pyramid_keys = []
+    for label, kind, args, prerender in default_view_layers(start_date, end_date):
+        layer_key = warm_layer(label, kind, args, state, refresh_margin, force=bool(new_dates))
+        if layer_key and prerender:
+            pyramid_keys.append(layer_key)
+
+    newest = dates[-1] if dates else None
+    for date in sorted(set(new_dates) | ({newest} if newest else set())):
+        for label, kind, args, prerender in date_layers(date, pyramid=date == newest):
+            layer_key = warm_layer(label, kind, args, state, refresh_margin)
+            if layer_key and prerender:
+                pyramid_keys.append(layer_key)
+
+    state['dates'] = dates
+    save_state(state)
+
+    if pyramid and PREWARM_PYRAMID_ZOOMS:
+        prerender_tiles(pyramid_keys, PREWARM_PYRAMID_ZOOMS)
+    logging.info("Tile pre-warm complete.")
+
+if __name__ == "__main__":
+    # Run script: (python -m app.utils.prewarm_tiles [--pyramid] [--interval 1800])
+    parser = argparse.ArgumentParser(description="BAYSENSE tile pre-warmer.")
+    parser.add_argument("--pyramid", action="store_true", help="Also pre-render the tiles covering the FLAs.")
+    parser.add_argument("--interval", type=int, default=PREWARM_INTERVAL_SECONDS, help="Seconds between runs (0 runs once).")
+    args = parser.parse_args()
+
+    if TILE_CACHE_BACKEND == 'memory':
+        logging.warning("TILE_CACHE_BACKEND is 'memory': map IDs built here are not shared with the API. Use sqlite or redis.")
+
+    while True:
+        started = time.time()
+        try:
+            prewarm_tiles(args.pyramid, PREWARM_REFRESH_MARGIN_SECONDS + max(0, args.interval))
+        except Exception as e:
+            logging.error(f"Tile pre-warm failed: {e}")
+        if args.interval <= 0:
+            break
+        time.sleep(max(0, args.interval - (time.time() - started)))
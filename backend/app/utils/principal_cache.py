@@ -0,0 +1,83 @@
+"""
+Short-lived cache of authenticated principals for token_required.
+
+Entries are keyed on (kind, subject id, token issue time) and hold plain snapshots of
+the columns the routes read, never ORM instances, so they're safe to share across
+requests and threads. Account changes call invalidate() in the worker that made them;
+other workers pick the change up when their entry expires after
+PRINCIPAL_CACHE_TTL_SECONDS.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', 60))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv('PRINCIPAL_CACHE_MAX_ENTRIES', 4096))
+
+
+class UserPrincipal:
+    """Snapshot of a User row for authenticated requests."""
+    is_admin = False
+
+    def __init__(self, user):
+        self.user_id = user.user_id
+        self.name = user.name
+        self.email = user.email
+        self.contact_no = user.contact_no
+        self.is_registered = user.is_registered
+        self.is_verified = user.is_verified
+
+
+class AdminPrincipal:
+    """Snapshot of an Admin row for authenticated requests."""
+    is_admin = True
+
+    def __init__(self, admin):
+        self.admin_id = admin.admin_id
+        self.username = admin.username
+
+
+class PrincipalCache:
+    """Size-bounded LRU of principals with a fixed TTL."""
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (kind, subject_id, iat) -> (principal, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, subject_id, iat):
+        key = (kind, subject_id, iat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, kind: str, subject_id, iat, principal):
+        key = (kind, subject_id, iat)
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind: str, subject_id):
+        """Drops every cached principal of the subject, whatever token it came from."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == kind and key[1] == subject_id]:
+                del self._entries[key]
+
+
+principal_cache = PrincipalCache()
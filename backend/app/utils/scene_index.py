@@ -0,0 +1,162 @@
+"""
+Locally persisted index of the Sentinel-2 scenes that intersect a region of interest.
+
+For every scene the index keeps its acquisition time, scene id and
+CLOUDY_PIXEL_PERCENTAGE, sorted by time. Date queries for any range and cloud
+threshold are answered with a bisect over the sorted times, without an Earth Engine
+call. The index is refreshed incrementally: only scenes acquired after the newest
+indexed one (minus a small overlap for late ingestion) are fetched.
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import datetime
+import threading
+from dotenv import load_dotenv
+
+from app.config import Config
+from app.utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# --- Configuration ---
+SCENE_INDEX_START_DATE = os.getenv('SCENE_INDEX_START_DATE', '2023-01-01')
+SCENE_INDEX_REFRESH_SECONDS = int(os.getenv('SCENE_INDEX_REFRESH_SECONDS', 60 * 60))
+# Scenes can show up in Earth Engine a few days after acquisition; re-check that window
+SCENE_INDEX_OVERLAP_DAYS = int(os.getenv('SCENE_INDEX_OVERLAP_DAYS', 5))
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+def date_to_ms(date_str: str) -> int:
+    """Converts a 'YYYY-MM-DD' date (UTC midnight) to epoch milliseconds."""
+    day = datetime.datetime.strptime(date_str[:10], '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    return int(day.timestamp() * 1000)
+
+def ms_to_date(ms: int) -> str:
+    """Converts epoch milliseconds to a 'YYYY-MM-DD' date (UTC)."""
+    return datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+class SceneIndex:
+    """Sorted, disk-backed list of (time, scene id, cloud percentage) for one ROI."""
+
+    def __init__(self, name: str, start_date: str = SCENE_INDEX_START_DATE):
+        self.name = name
+        self.path = os.path.join(Config.CACHE_DIR, 'scene_index', f"{name}.json")
+        self.start_ms = date_to_ms(start_date)
+        self.version = None
+        self.times = []
+        self.scene_ids = []
+        self.clouds = []
+        self.refreshed_at = 0
+        self._loaded_mtime = None
+        self._lock = threading.RLock()
+        self._flight = SingleFlight()
+
+    def _reset(self, version):
+        self.version = version
+        self.times, self.scene_ids, self.clouds = [], [], []
+        self.refreshed_at = 0
+
+    def _load(self):
+        """Loads the index from disk if the file was written since the last load."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable scene index {self.path}: {e}")
+            return
+        if data.get('start_ms') != self.start_ms:
+            return
+        with self._lock:
+            self.version = data['version']
+            self.times = data['times']
+            self.scene_ids = data['scene_ids']
+            self.clouds = data['clouds']
+            self.refreshed_at = data['refreshed_at']
+            self._loaded_mtime = mtime
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': self.version,
+                'start_ms': self.start_ms,
+                'refreshed_at': self.refreshed_at,
+                'times': self.times,
+                'scene_ids': self.scene_ids,
+                'clouds': self.clouds,
+            }, f)
+        os.replace(tmp_path, self.path)
+        self._loaded_mtime = os.path.getmtime(self.path)
+
+    def refresh(self, version: str, fetch, force: bool = False):
+        """
+        Brings the index up to date for the given ROI version.
+        `fetch(since_ms)` must return [time_ms, scene_id, cloud_percentage] rows for
+        every scene acquired at or after since_ms. A changed version rebuilds the index.
+        """
+        self._load()
+        with self._lock:
+            fresh = self.version == version and time.time() - self.refreshed_at < SCENE_INDEX_REFRESH_SECONDS
+        if fresh and not force:
+            return
+        self._flight.do(version, self._refresh, version, fetch)
+
+    def _refresh(self, version, fetch):
+        with self._lock:
+            if self.version != version:
+                logging.info(f"Rebuilding scene index '{self.name}' for version {version}")
+                self._reset(version)
+            since_ms = max(self.start_ms, self.times[-1] - SCENE_INDEX_OVERLAP_DAYS * DAY_MS) if self.times else self.start_ms
+
+        rows = fetch(since_ms) or []
+
+        with self._lock:
+            known = set(self.scene_ids)
+            new_rows = [row for row in rows if row[0] is not None and row[1] not in known]
+            if new_rows:
+                merged = sorted(
+                    list(zip(self.times, self.scene_ids, self.clouds)) +
+                    [(int(t), scene_id, cloud if cloud is not None else 100.0) for t, scene_id, cloud in new_rows]
+                )
+                self.times = [row[0] for row in merged]
+                self.scene_ids = [row[1] for row in merged]
+                self.clouds = [row[2] for row in merged]
+                logging.info(f"Scene index '{self.name}': added {len(new_rows)} scene(s), {len(self.times)} total")
+            self.refreshed_at = time.time()
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f"Could not persist scene index '{self.name}': {e}")
+
+    def covers(self, start_date: str) -> bool:
+        """Whether queries starting at start_date can be answered from the index."""
+        return date_to_ms(start_date) >= self.start_ms
+
+    def query(self, start_date: str, end_date: str, cloud_cover: float = 20):
+        """
+        Returns (time_ms, scene_id, cloud_percentage) for scenes in [start_date, end_date)
+        with cloud percentage below cloud_cover, matching filterDate/filterMetadata.
+        """
+        with self._lock:
+            lo = bisect.bisect_left(self.times, date_to_ms(start_date))
+            hi = bisect.bisect_left(self.times, date_to_ms(end_date))
+            return [
+                (self.times[i], self.scene_ids[i], self.clouds[i])
+                for i in range(lo, hi) if self.clouds[i] < cloud_cover
+            ]
+
+    def dates(self, start_date: str, end_date: str, cloud_cover: float = 20):
+        """Returns the sorted, distinct 'YYYY-MM-DD' dates with matching scenes."""
+        return sorted(set(ms_to_date(t) for t, _, _ in self.query(start_date, end_date, cloud_cover)))
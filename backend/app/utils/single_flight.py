@@ -0,0 +1,80 @@
+"""
+Single-flight coalescing for identical concurrent Earth Engine computations.
+
+When several requests ask for the same result at the same time (e.g. many dashboards
+opening at once), only the first caller runs the computation. Everyone else waits for
+it and receives the same result, or the same exception if it failed.
+Coalescing is per process; each gunicorn worker has its own set of in-flight calls.
+"""
+
+import logging
+import threading
+from functools import wraps
+
+from app.utils.tile_cache import make_cache_key
+
+class _Call:
+    """An in-flight computation shared by every caller with the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Groups concurrent calls by key so each key is computed at most once at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logging.debug(f"Single-flight call shared with {call.waiters} waiting caller(s)")
+            call.done.set()
+        return call.result
+
+
+_group = SingleFlight()
+
+def single_flight(namespace: str):
+    """
+    Decorator coalescing concurrent calls that have the same (normalized) arguments.
+    Errors raised by the shared computation propagate to every waiting caller.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_cache_key(namespace, func, args, kwargs)
+            except TypeError:
+                return func(*args, **kwargs)
+            return _group.do(key, func, *args, **kwargs)
+        return wrapper
+    return decorator
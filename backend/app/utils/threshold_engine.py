@@ -0,0 +1,138 @@
+"""
+Vectorized threshold evaluation for water quality and meteorological alerts.
+
+All ParameterThresholds rows are loaded into NumPy arrays indexed by FLA, and a whole
+batch of (FLA, parameter, date, value) readings is compared against them at once.
+Python-level work is only done for the readings that actually breach a threshold.
+"""
+
+import logging
+import numpy as np
+
+# Parameters in column order of the threshold arrays
+WATER_QUALITY_PARAMETERS = ('chlorophyll', 'turbidity', 'tss')
+METEOROLOGICAL_PARAMETERS = ('gust_speed', 'rainfall')
+
+# ParameterThresholds (min, max) columns per parameter; None means no lower bound
+THRESHOLD_COLUMNS = {
+    'chlorophyll': ('chla_min', 'chla_max'),
+    'turbidity': ('turbidity_min', 'turbidity_max'),
+    'tss': ('tss_min', 'tss_max'),
+    'gust_speed': (None, 'gust_speed_max'),
+    'rainfall': (None, 'rainfall_max'),
+}
+
+# Parameter-specific alert messages, keyed by (parameter, 'low' | 'high')
+BREACH_MESSAGES = {
+    ('chlorophyll', 'low'): ("Chlorophyll too low: {value:.2f} (min {limit:.2f}). "
+                             "Low algal activity may reduce oxygen levels."),
+    ('chlorophyll', 'high'): ("Chlorophyll too high: {value:.2f} (max {limit:.2f}). "
+                              "Potential algal bloom, may cause oxygen depletion."),
+    ('turbidity', 'low'): ("Turbidity too low: {value:.2f} (min {limit:.2f}). "
+                           "Water unusually clear, may lack nutrients."),
+    ('turbidity', 'high'): ("Turbidity too high: {value:.2f} (max {limit:.2f}). "
+                            "Reduces light penetration, may stress fish."),
+    ('tss', 'low'): ("Suspended solids too low: {value:.2f} (min {limit:.2f}). "
+                     "Insufficient particles for filter feeders."),
+    ('tss', 'high'): ("Suspended solids too high: {value:.2f} (max {limit:.2f}). "
+                      "May clog fish gills, indicates possible runoff."),
+    ('gust_speed', 'high'): ("Strong gusts forecast: {value:.1f} m/s (max {limit:.1f} m/s). "
+                             "Secure cages and moorings."),
+    ('rainfall', 'high'): ("Heavy rainfall forecast: {value:.1f} mm/h (max {limit:.1f} mm/h). "
+                           "Runoff may lower salinity and raise turbidity."),
+}
+
+
+def _lookup(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Returns the position of each key in sorted_keys, or -1 where it is missing."""
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1)
+    positions = np.searchsorted(sorted_keys, keys)
+    clipped = np.minimum(positions, len(sorted_keys) - 1)
+    return np.where(sorted_keys[clipped] == keys, clipped, -1)
+
+
+class ThresholdEngine:
+    """Threshold arrays for every FLA, evaluated against batches of readings."""
+
+    def __init__(self, flas, mins, maxs, parameters=WATER_QUALITY_PARAMETERS):
+        order = np.argsort(np.asarray(flas, dtype=str))
+        self.flas = np.asarray(flas, dtype=str)[order]
+        self.parameters = np.asarray(parameters, dtype=str)
+        self._parameter_order = np.argsort(self.parameters)
+        self.mins = np.asarray(mins, dtype=float).reshape(len(flas), len(parameters))[order]
+        self.maxs = np.asarray(maxs, dtype=float).reshape(len(flas), len(parameters))[order]
+
+    @classmethod
+    def load(cls, db_session, parameters=WATER_QUALITY_PARAMETERS):
+        """Loads every ParameterThresholds row into a new engine for the given parameters."""
+        from app.models import ParameterThresholds
+
+        columns = [ParameterThresholds.fla]
+        for parameter in parameters:
+            columns.extend(
+                getattr(ParameterThresholds, column) for column in THRESHOLD_COLUMNS[parameter] if column is not None
+            )
+        rows = db_session.query(*columns).all()
+
+        mins = np.full((len(rows), len(parameters)), -np.inf)
+        maxs = np.full((len(rows), len(parameters)), np.inf)
+        position = 1
+        for i, parameter in enumerate(parameters):
+            min_column, max_column = THRESHOLD_COLUMNS[parameter]
+            if min_column is not None:
+                mins[:, i] = [row[position] for row in rows]
+                position += 1
+            maxs[:, i] = [row[position] for row in rows]
+            position += 1
+
+        logging.info(f"Loaded thresholds for {len(rows)} FLAs")
+        return cls([row[0] for row in rows], mins, maxs, parameters)
+
+    def __len__(self):
+        return len(self.flas)
+
+    def has_fla(self, fla: str) -> bool:
+        return _lookup(self.flas, np.asarray([fla], dtype=str))[0] >= 0
+
+    def evaluate(self, flas, parameters, dates, values) -> list:
+        """
+        Compares every reading with its FLA's thresholds in one vectorized pass.
+        Readings are given as parallel sequences; missing values (None/NaN), unknown FLAs
+        and unknown parameters are skipped. Returns one breach record per breaching
+        reading: {fla, parameter, date, value, limit, direction, message}.
+        """
+        flas = np.asarray(flas, dtype=str)
+        parameters = np.asarray(parameters, dtype=str)
+        values = np.asarray([np.nan if v is None else v for v in values], dtype=float)
+        if len(values) == 0:
+            return []
+
+        fla_idx = _lookup(self.flas, flas)
+        sorted_parameters = self.parameters[self._parameter_order]
+        parameter_pos = _lookup(sorted_parameters, parameters)
+        parameter_idx = np.where(parameter_pos >= 0, self._parameter_order[np.maximum(parameter_pos, 0)], -1)
+
+        valid = (fla_idx >= 0) & (parameter_idx >= 0) & ~np.isnan(values)
+        safe_fla, safe_parameter = np.maximum(fla_idx, 0), np.maximum(parameter_idx, 0)
+        mins = self.mins[safe_fla, safe_parameter]
+        maxs = self.maxs[safe_fla, safe_parameter]
+
+        low = valid & (values < mins)
+        high = valid & (values > maxs)
+
+        breaches = []
+        for i in np.flatnonzero(low | high):
+            direction = 'low' if low[i] else 'high'
+            limit = float(mins[i] if low[i] else maxs[i])
+            parameter = str(parameters[i])
+            breaches.append({
+                'fla': str(flas[i]),
+                'parameter': parameter,
+                'date': dates[i],
+                'value': float(values[i]),
+                'limit': limit,
+                'direction': direction,
+                'message': BREACH_MESSAGES[(parameter, direction)].format(value=float(values[i]), limit=limit),
+            })
+        return breaches
@@ -0,0 +1,270 @@
+"""
+Cache for tile results produced by the Earth Engine service functions.
+
+Building a tile layer costs a full EE graph, a percentile reduceRegion().getInfo()
+and a getMapId() round trip. The result (tile_url + stretch_params) only depends on
+the request parameters and the version of the asset, so it is cached under both until
+the map ID is about to expire.
+
+Backends:
+    memory  - in-process LRU dict (default)
+    sqlite  - on-disk SQLite file, shared by all gunicorn workers on the host
+    redis   - any Redis-compatible server (requires the optional `redis` package)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from dotenv import load_dotenv
+
+from app.config import Config
+from app.utils.lru_cache import LRUCache
+
+load_dotenv()
+
+# --- Configuration ---
+TILE_CACHE_BACKEND = os.getenv('TILE_CACHE_BACKEND', 'memory').lower()
+# EE map IDs stay valid for a few hours; expire entries well before that
+TILE_CACHE_TTL_SECONDS = int(os.getenv('TILE_CACHE_TTL_SECONDS', 2 * 60 * 60))
+TILE_CACHE_MAX_ENTRIES = int(os.getenv('TILE_CACHE_MAX_ENTRIES', 512))
+TILE_CACHE_SQLITE_PATH = os.getenv('TILE_CACHE_SQLITE_PATH', os.path.join(Config.CACHE_DIR, 'tile_cache.sqlite3'))
+TILE_CACHE_REDIS_URL = os.getenv('TILE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+TILE_CACHE_KEY_PREFIX = 'baysense:tiles:'
+
+
+class MemoryCacheBackend(LRUCache):
+    """In-process LRU cache with per-entry expiry; the default backend."""
+
+
+class SQLiteCacheBackend:
+    """
+    LRU cache stored in a SQLite file so every worker process on the host shares it.
+    A connection is opened per operation, which keeps the backend safe across forks.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS tile_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tile_cache_last_access ON tile_cache(last_access)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at FROM tile_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute('DELETE FROM tile_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE tile_cache SET last_access = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO tile_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+            conn.execute('DELETE FROM tile_cache WHERE expires_at <= ?', (now,))
+            # Evict the least recently used entries beyond the size bound
+            conn.execute(
+                'DELETE FROM tile_cache WHERE key IN ('
+                'SELECT key FROM tile_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM tile_cache WHERE key = ?', (key,))
+
+
+class RedisCacheBackend:
+    """
+    Cache stored in a Redis-compatible server. Expiry uses native key TTLs and
+    a sorted set of access times bounds the number of entries (LRU).
+    """
+
+    def __init__(self, url: str, max_entries: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("TILE_CACHE_BACKEND=redis requires the 'redis' package to be installed.")
+        self.max_entries = max_entries
+        self._client = redis.Redis.from_url(url)
+        self._lru_key = f"{TILE_CACHE_KEY_PREFIX}lru"
+
+    def get(self, key: str):
+        value = self._client.get(TILE_CACHE_KEY_PREFIX + key)
+        if value is None:
+            self._client.zrem(self._lru_key, key)
+            return None
+        self._client.zadd(self._lru_key, {key: time.time()})
+        return value.decode('utf-8')
+
+    def set(self, key: str, value: str, ttl: int):
+        pipe = self._client.pipeline()
+        pipe.set(TILE_CACHE_KEY_PREFIX + key, value, ex=ttl)
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.zcard(self._lru_key)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            evicted = self._client.zpopmin(self._lru_key, size - self.max_entries)
+            if evicted:
+                self._client.delete(*[TILE_CACHE_KEY_PREFIX + k.decode('utf-8') for k, _ in evicted])
+
+    def delete(self, key: str):
+        self._client.delete(TILE_CACHE_KEY_PREFIX + key)
+        self._client.zrem(self._lru_key, key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+def get_tile_cache():
+    """Returns the configured cache backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if TILE_CACHE_BACKEND == 'sqlite':
+                    _backend = SQLiteCacheBackend(TILE_CACHE_SQLITE_PATH, TILE_CACHE_MAX_ENTRIES)
+                elif TILE_CACHE_BACKEND == 'redis':
+                    _backend = RedisCacheBackend(TILE_CACHE_REDIS_URL, TILE_CACHE_MAX_ENTRIES)
+                else:
+                    if TILE_CACHE_BACKEND != 'memory':
+                        logging.warning(f"Unknown TILE_CACHE_BACKEND '{TILE_CACHE_BACKEND}'. Falling back to in-memory cache.")
+                    _backend = MemoryCacheBackend(TILE_CACHE_MAX_ENTRIES)
+                logging.info(f"Tile cache backend: {type(_backend).__name__}")
+    return _backend
+
+def _normalize_value(name: str, value):
+    """Normalizes a single argument so equivalent requests map to the same key."""
+    if isinstance(value, str):
+        value = value.strip()
+        if name.endswith('date') or name == 'date':
+            # Only plain dates are canonicalized; a time of day changes what filterDate selects
+            try:
+                return datetime.datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return value
+        if name == 'parameter':
+            return value.lower()
+        if len(value) > 64:
+            # Large payloads (e.g. polygon coordinate JSON) are keyed by their digest
+            return hashlib.sha256(value.encode('utf-8')).hexdigest()
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def normalize_call_args(func, args, kwargs) -> dict:
+    """Binds a call to its signature (including defaults) and normalizes every argument."""
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {name: _normalize_value(name, value) for name, value in bound.arguments.items()}
+
+def make_cache_key(namespace: str, func, args, kwargs, version=None) -> str:
+    """
+    Builds a stable key from the namespace and the normalized call arguments.
+    version(normalized arguments), if given, identifies the version of the inputs the
+    result is built from and becomes part of the key.
+    """
+    normalized = normalize_call_args(func, args, kwargs)
+    key = [namespace, normalized]
+    if version is not None:
+        key.append(version(normalized))
+    raw = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _encode_result(result) -> str:
+    if isinstance(result, dict):
+        # Multi-layer results: {layer: {tile_url, ...}}
+        return json.dumps({'layers': result})
+    if isinstance(result, tuple):
+        tile_url, stretch_params = result
+        return json.dumps({'tile_url': tile_url, 'stretch_params': stretch_params})
+    return json.dumps({'tile_url': result})
+
+def _is_empty_result(result) -> bool:
+    if isinstance(result, dict):
+        return not result
+    if isinstance(result, tuple):
+        return not result or result[0] is None
+    return result is None
+
+def cached_tile_result(namespace: str, version=None):
+    """
+    Decorator caching the result of a tile service function.
+    Supports functions returning `tile_url`, `(tile_url, stretch_params)` or a dict of layers.
+    Empty results (no imagery, invalid parameter) are not cached.
+    version(normalized arguments) returns the version of the function's inputs, e.g. the
+    update time of its asset; results built from an older version are not served.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_tile_cache()
+            try:
+                key = make_cache_key(namespace, func, args, kwargs, version)
+            except TypeError:
+                # Arguments don't match the signature; let the function raise the error
+                return func(*args, **kwargs)
+
+            try:
+                cached = cache.get(key)
+            except Exception as e:
+                logging.warning(f"Tile cache lookup failed for {namespace}: {e}")
+                cached = None
+
+            if cached is not None:
+                payload = json.loads(cached)
+                logging.debug(f"Tile cache hit for {namespace}")
+                if 'layers' in payload:
+                    return payload['layers']
+                if 'stretch_params' in payload:
+                    return payload['tile_url'], payload['stretch_params']
+                return payload['tile_url']
+
+            result = func(*args, **kwargs)
+            if not _is_empty_result(result):
+                try:
+                    cache.set(key, _encode_result(result), TILE_CACHE_TTL_SECONDS)
+                except Exception as e:
+                    logging.warning(f"Tile cache store failed for {namespace}: {e}")
+            return result
+
+        def invalidate(*args, **kwargs):
+            """Drops the cached result of a call, e.g. when its map ID has expired upstream."""
+            try:
+                get_tile_cache().delete(make_cache_key(namespace, func, args, kwargs, version))
+            except Exception as e:
+                logging.warning(f"Tile cache delete failed for {namespace}: {e}")
+
+        wrapper.invalidate = invalidate
+        return wrapper
+    return decorator
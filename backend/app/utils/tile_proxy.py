@@ -0,0 +1,343 @@
+"""
+Caching proxy in front of Earth Engine tile URLs.
+
+Routes hand out /tiles/<layer_key>/{z}/{x}/{y}.png instead of the raw
+tile_fetcher.url_format. The layer key is the digest of the layer's spec (the kind of
+layer plus the arguments of the service function that builds it), and the spec is
+kept next to the layer's tiles on disk so every worker on the host can resolve it.
+Resolving a layer goes through the service function and therefore through the tile
+result cache, so an expired map ID is rebuilt transparently.
+
+Fetched PNGs are stored under TILE_PROXY_DIR/<layer_key>/<map>/<z>/<x>/<y>.png,
+where <map> is a digest of the map ID's URL template, so tiles always match the
+legend of the map ID they were rendered with. File mtimes track last use and the
+least recently used tiles are evicted once the cache grows past its size cap.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+from app.config import Config
+from app.utils.tile_cache import MemoryCacheBackend
+from app.utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# --- Configuration ---
+TILE_PROXY_DIR = os.path.join(Config.CACHE_DIR, 'tiles')
+TILE_PROXY_BASE_URL = os.getenv('TILE_PROXY_BASE_URL') # Public URL of the API; defaults to the request's host
+TILE_PROXY_DISK_MAX_BYTES = int(os.getenv('TILE_PROXY_DISK_MAX_MB', 1024)) * 1024 * 1024
+TILE_PROXY_DISK_TARGET_RATIO = 0.9 # Evict down to this fraction of the cap
+TILE_PROXY_LAYER_TTL_SECONDS = int(os.getenv('TILE_PROXY_LAYER_TTL_SECONDS', 7 * 24 * 60 * 60))
+TILE_PROXY_RESOLVE_TTL_SECONDS = int(os.getenv('TILE_PROXY_RESOLVE_TTL_SECONDS', 60))
+TILE_PROXY_MAX_AGE_SECONDS = int(os.getenv('TILE_PROXY_MAX_AGE_SECONDS', 60 * 60)) # Browser cache
+TILE_PROXY_CONNECT_TIMEOUT_SECONDS = float(os.getenv('TILE_PROXY_CONNECT_TIMEOUT_SECONDS', 3.05))
+TILE_PROXY_TIMEOUT_SECONDS = float(os.getenv('TILE_PROXY_TIMEOUT_SECONDS', 20))
+TILE_PROXY_MAX_CONNECTIONS = int(os.getenv('TILE_PROXY_MAX_CONNECTIONS', 16))
+# A map ID younger than this is not rebuilt when upstream rejects one of its tiles
+TILE_PROXY_MIN_MAP_AGE_SECONDS = int(os.getenv('TILE_PROXY_MIN_MAP_AGE_SECONDS', 5 * 60))
+TOUCH_INTERVAL_SECONDS = 60
+LAYER_FILE = 'layer.json'
+LAYER_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+MAX_ZOOM = 24
+# Upstream answers for a map ID that may have expired
+EXPIRED_MAP_STATUSES = (400, 403, 404)
+
+_layer_kinds = {} # kind -> (resolve(args) -> url template or None, invalidate(args))
+_layers = {} # layer_key -> (spec, touched_at)
+_layers_lock = threading.Lock()
+_resolved = MemoryCacheBackend(4096) # layer_key -> url template
+_map_seen = MemoryCacheBackend(4096) # url template -> first seen at
+_flight = SingleFlight()
+_session = None
+_session_lock = threading.Lock()
+_disk_usage = None # Bytes on disk as estimated by this process, None until the first sweep
+_disk_lock = threading.Lock()
+_sweeping = False
+
+
+class TileProxyError(Exception):
+    """Raised when a proxied tile can't be served; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def register_layer_kind(kind: str, resolve, invalidate=None):
+    """
+    Registers a kind of layer. resolve(args) returns the layer's tile URL template (or
+    None without imagery); invalidate(args) drops its cached map ID.
+    """
+    _layer_kinds[kind] = (resolve, invalidate)
+
+def _layer_dir(layer_key: str) -> str:
+    return os.path.join(TILE_PROXY_DIR, layer_key)
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def register_layer(kind: str, **args) -> str:
+    """Records a layer spec and returns its key; the same spec always gets the same key."""
+    if kind not in _layer_kinds:
+        raise ValueError(f"Unknown tile layer kind '{kind}'")
+    spec = {'kind': kind, 'args': args}
+    raw = json.dumps(spec, sort_keys=True, default=str)
+    layer_key = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+    now = time.time()
+    with _layers_lock:
+        entry = _layers.get(layer_key)
+    if entry is not None and now - entry[1] < TOUCH_INTERVAL_SECONDS:
+        return layer_key
+
+    path = os.path.join(_layer_dir(layer_key), LAYER_FILE)
+    try:
+        if os.path.exists(path):
+            os.utime(path) # Handed out again; keeps the layer from expiring
+        else:
+            _write_atomic(path, raw.encode('utf-8'))
+    except OSError as e:
+        logging.warning(f"Could not persist tile layer {layer_key}: {e}")
+    with _layers_lock:
+        _layers[layer_key] = (json.loads(raw), now)
+    return layer_key
+
+def load_layer(layer_key: str):
+    """Returns the spec of a registered layer, or None if it is unknown."""
+    with _layers_lock:
+        entry = _layers.get(layer_key)
+    if entry is not None:
+        return entry[0]
+    try:
+        with open(os.path.join(_layer_dir(layer_key), LAYER_FILE), 'rb') as f:
+            spec = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    with _layers_lock:
+        _layers[layer_key] = (spec, time.time())
+    return spec
+
+def layer_tile_url(layer_key: str, base_url: str) -> str:
+    """Absolute XYZ URL template of a proxied layer."""
+    return f"{(TILE_PROXY_BASE_URL or base_url).rstrip('/')}/tiles/{layer_key}/{{z}}/{{x}}/{{y}}.png"
+
+def _resolve(layer_key: str, spec: dict) -> str:
+    url_format = _resolved.get(layer_key)
+    if url_format is not None:
+        return url_format
+    resolve, _ = _layer_kinds[spec['kind']]
+    url_format = resolve(dict(spec['args']))
+    if not url_format:
+        raise TileProxyError("No imagery available for this layer", 404)
+    _resolved.set(layer_key, url_format, TILE_PROXY_RESOLVE_TTL_SECONDS)
+    if _map_seen.get(url_format) is None:
+        _map_seen.set(url_format, time.time(), TILE_PROXY_LAYER_TTL_SECONDS)
+    return url_format
+
+def resolve_layer(layer_key: str, refresh: bool = False) -> str:
+    """
+    Returns the current tile URL template of a registered layer, building its map ID
+    if needed. refresh drops the cached map ID first so a new one is built.
+    """
+    spec = load_layer(layer_key)
+    if spec is None or spec.get('kind') not in _layer_kinds:
+        raise TileProxyError("Unknown tile layer", 404)
+    if refresh:
+        _, invalidate = _layer_kinds[spec['kind']]
+        if invalidate is not None:
+            invalidate(dict(spec['args']))
+        _resolved.delete(layer_key)
+    return _resolve(layer_key, spec)
+
+def _invalidate(layer_key: str, spec: dict, url_format: str) -> bool:
+    """Drops the layer's map ID unless it was just built; returns whether it did."""
+    first_seen = _map_seen.get(url_format)
+    if first_seen is not None and time.time() - first_seen < TILE_PROXY_MIN_MAP_AGE_SECONDS:
+        return False
+    _, invalidate = _layer_kinds[spec['kind']]
+    if invalidate is None:
+        return False
+    logging.info(f"Upstream rejected the map ID of tile layer {layer_key}; rebuilding it")
+    invalidate(dict(spec['args']))
+    _resolved.delete(layer_key)
+    return True
+
+def _tile_path(layer_key: str, url_format: str, z: int, x: int, y: int) -> str:
+    generation = hashlib.sha1(url_format.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_layer_dir(layer_key), generation, str(z), str(x), f"{y}.png")
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session for upstream tiles, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retries = Retry(total=2, backoff_factor=0.25, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=TILE_PROXY_MAX_CONNECTIONS, max_retries=retries)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def _reset_after_fork():
+    # Pooled sockets and the sweeper thread don't survive a fork
+    global _session, _session_lock, _layers_lock, _disk_lock, _sweeping
+    _session = None
+    _session_lock = threading.Lock()
+    _layers_lock = threading.Lock()
+    _disk_lock = threading.Lock()
+    _sweeping = False
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _fetch_upstream(url_format: str, z: int, x: int, y: int) -> requests.Response:
+    url = url_format.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
+    try:
+        return get_session().get(url, timeout=(TILE_PROXY_CONNECT_TIMEOUT_SECONDS, TILE_PROXY_TIMEOUT_SECONDS))
+    except requests.RequestException as e:
+        raise TileProxyError(f"Failed to fetch upstream tile: {e}", 502)
+
+def _fetch_to_disk(layer_key: str, spec: dict, url_format: str, z: int, x: int, y: int) -> str:
+    path = _tile_path(layer_key, url_format, z, x, y)
+    if os.path.exists(path):
+        return path # Stored by a caller that finished just before us
+
+    response = _fetch_upstream(url_format, z, x, y)
+    if response.status_code in EXPIRED_MAP_STATUSES and _invalidate(layer_key, spec, url_format):
+        url_format = _resolve(layer_key, spec)
+        path = _tile_path(layer_key, url_format, z, x, y)
+        response = _fetch_upstream(url_format, z, x, y)
+
+    if response.status_code != 200:
+        raise TileProxyError(f"Upstream tile request failed with status {response.status_code}", 404 if response.status_code == 404 else 502)
+    if not response.headers.get('Content-Type', '').startswith('image/'):
+        raise TileProxyError(f"Upstream returned {response.headers.get('Content-Type')} instead of an image", 502)
+
+    try:
+        _write_atomic(path, response.content)
+    except OSError as e:
+        raise TileProxyError(f"Could not store tile: {e}", 500)
+    _account(len(response.content))
+    return path
+
+def get_tile(layer_key: str, z: int, x: int, y: int) -> str:
+    """
+    Returns the path of the cached PNG for a tile of the layer, fetching it from
+    upstream on a miss. Concurrent misses for the same tile share one upstream request.
+    """
+    if not LAYER_KEY_PATTERN.match(layer_key):
+        raise TileProxyError("Unknown tile layer", 404)
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise TileProxyError("Tile out of range", 404)
+    spec = load_layer(layer_key)
+    if spec is None or spec.get('kind') not in _layer_kinds:
+        raise TileProxyError("Unknown tile layer", 404)
+
+    url_format = _resolve(layer_key, spec)
+    path = _tile_path(layer_key, url_format, z, x, y)
+    try:
+        mtime = os.stat(path).st_mtime
+        if time.time() - mtime > TOUCH_INTERVAL_SECONDS:
+            os.utime(path) # Mark as recently used for eviction
+        return path
+    except FileNotFoundError:
+        pass
+    return _flight.do(path, _fetch_to_disk, layer_key, spec, url_format, z, x, y)
+
+def _account(size: int):
+    """Adds a stored tile to the usage estimate and starts a sweep when over the cap."""
+    global _disk_usage, _sweeping
+    with _disk_lock:
+        if _disk_usage is not None:
+            _disk_usage += size
+            if _disk_usage <= TILE_PROXY_DISK_MAX_BYTES:
+                return
+        if _sweeping:
+            return
+        _sweeping = True
+
+    def sweep():
+        global _sweeping
+        try:
+            sweep_disk_cache()
+        except Exception as e:
+            logging.warning(f"Tile disk cache sweep failed: {e}")
+        finally:
+            with _disk_lock:
+                _sweeping = False
+
+    threading.Thread(target=sweep, name='tile-sweep', daemon=True).start()
+
+def sweep_disk_cache(max_bytes: int = TILE_PROXY_DISK_MAX_BYTES) -> dict:
+    """
+    Removes layers that haven't been handed out for TILE_PROXY_LAYER_TTL_SECONDS, then
+    evicts the least recently used tiles until the cache is below its target size.
+    Returns {'bytes', 'tiles', 'evicted'}.
+    """
+    global _disk_usage
+    now = time.time()
+    tiles, total = [], 0
+    try:
+        layer_keys = os.listdir(TILE_PROXY_DIR)
+    except FileNotFoundError:
+        layer_keys = []
+
+    for layer_key in layer_keys:
+        layer_dir = _layer_dir(layer_key)
+        try:
+            layer_age = now - os.stat(os.path.join(layer_dir, LAYER_FILE)).st_mtime
+        except OSError:
+            layer_age = float('inf')
+        if layer_age > TILE_PROXY_LAYER_TTL_SECONDS:
+            shutil.rmtree(layer_dir, ignore_errors=True)
+            with _layers_lock:
+                _layers.pop(layer_key, None)
+            continue
+
+        for dirpath, _, filenames in os.walk(layer_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith('.png'):
+                    tiles.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+                elif name.endswith('.tmp') and now - stat.st_mtime > 60 * 60:
+                    os.remove(path) # Left behind by an interrupted write
+
+    evicted = 0
+    if total > max_bytes:
+        target = max_bytes * TILE_PROXY_DISK_TARGET_RATIO
+        tiles.sort()
+        for _, size, path in tiles:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        logging.info(f"Evicted {evicted} tile(s) from the disk cache, {total / 1024 / 1024:.1f} MB left")
+
+    with _disk_lock:
+        _disk_usage = total
+    return {'bytes': total, 'tiles': len(tiles) - evicted, 'evicted': evicted}
@@ -0,0 +1,140 @@
+"""
+Materialized per-FLA, per-scene parameter means.
+
+The means of a scene never change once it has been acquired, so they are computed
+once (by the ingestion job, or on demand for scenes it hasn't reached yet) and stored
+in ParameterTimeSeries. Time-series requests then read a range slice with one indexed
+query, and only scenes that are missing from the table are sent to Earth Engine.
+A scene that yields no means at all is stored as a single marker row, so it isn't
+recomputed either.
+"""
+
+import logging
+import datetime
+from sqlalchemy import distinct
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import ParameterTimeSeries
+from app.utils.scene_index import date_to_ms
+from app.utils.alert_store import ms_to_utc
+from app.utils.threshold_engine import WATER_QUALITY_PARAMETERS
+
+INSERT_BATCH_ROWS = 5000
+# fla of the row that marks a processed scene without any means
+SCENE_MARKER_FLA = ''
+
+def _db_row(fla: str, scene_id: str, time_ms: int, cloud_cover: float, values: dict, now) -> dict:
+    scene_time = ms_to_utc(time_ms)
+    return {
+        'fla': fla,
+        'scene_id': scene_id,
+        'scene_time': scene_time,
+        'observation_date': scene_time.date(),
+        'cloud_cover': cloud_cover,
+        **{parameter: values.get(parameter) for parameter in WATER_QUALITY_PARAMETERS},
+        'ingested_at': now,
+    }
+
+def _to_db_rows(means_rows: list, clouds: dict, scenes: list) -> list:
+    """
+    Converts EE mean rows to ParameterTimeSeries rows, skipping incomplete ones, and adds
+    a marker row for every scene of (time_ms, scene_id) that has no row.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = []
+    for row in means_rows:
+        scene_id, name, time_ms = row.get('scene_id'), row.get('Name'), row.get('time')
+        if scene_id is None or name is None or time_ms is None or scene_id not in clouds:
+            continue
+        rows.append(_db_row(str(name), scene_id, time_ms, clouds[scene_id], row, now))
+
+    stored = {row['scene_id'] for row in rows}
+    for time_ms, scene_id in scenes:
+        if scene_id not in stored and scene_id in clouds:
+            rows.append(_db_row(SCENE_MARKER_FLA, scene_id, time_ms, clouds[scene_id], {}, now))
+            stored.add(scene_id)
+    return rows
+
+def store_scene_means(db_session, means_rows: list, clouds: dict, scenes: list = ()) -> int:
+    """
+    Inserts the means of whole scenes; rows already stored are left as they are.
+    clouds maps scene_id to its cloud percentage. scenes lists the (time_ms, scene_id)
+    the means were computed for; those without any row are stored as processed with a
+    marker row. The caller commits.
+    """
+    rows = _to_db_rows(means_rows, clouds, scenes)
+    for start in range(0, len(rows), INSERT_BATCH_ROWS):
+        stmt = pg_insert(ParameterTimeSeries.__table__).values(rows[start:start + INSERT_BATCH_ROWS])
+        db_session.execute(stmt.on_conflict_do_nothing(index_elements=['fla', 'scene_id']))
+    return len(rows)
+
+def ingested_scene_ids(db_session) -> set:
+    """Returns the ids of every processed scene, including those without means."""
+    return {scene_id for (scene_id,) in db_session.query(distinct(ParameterTimeSeries.scene_id)).all()}
+
+def read_series(db_session, parameter: str, start_date: str, end_date: str, cloud_cover: float):
+    """
+    Reads one parameter for scenes acquired in [start_date, end_date) with cloud
+    percentage below cloud_cover. Returns ({fla: [{date, value}]}, ids of the scenes
+    found), where scenes without a value for an FLA, or without any means, still count
+    as found.
+    """
+    column = getattr(ParameterTimeSeries, parameter)
+    rows = db_session.query(
+        ParameterTimeSeries.fla, ParameterTimeSeries.scene_id, ParameterTimeSeries.observation_date, column
+    ).filter(
+        ParameterTimeSeries.scene_time >= ms_to_utc(date_to_ms(start_date)),
+        ParameterTimeSeries.scene_time < ms_to_utc(date_to_ms(end_date)),
+        ParameterTimeSeries.cloud_cover < cloud_cover
+    ).all()
+
+    series, scene_ids = {}, set()
+    for fla, scene_id, observation_date, value in rows:
+        scene_ids.add(scene_id)
+        if fla == SCENE_MARKER_FLA:
+            continue
+        values = series.setdefault(fla, [])
+        if value is not None:
+            values.append({'date': observation_date.strftime('%Y-%m-%d'), 'value': value})
+    return series, scene_ids
+
+def get_parameter_series(db_session, parameter: str, start_date: str, end_date: str, asset_id: str, cloud_cover: float = 20):
+    """
+    Time series of a parameter for every polygon of the asset, read from the table.
+    Scenes in the range that haven't been ingested yet are computed with Earth Engine
+    and stored. Returns None when the scene index can't answer the range, so the caller
+    can fall back to computing everything with Earth Engine.
+    """
+    from app.utils.isdaan_ee_service import get_scene_index, get_all_parameter_means_for_scenes, get_polygon_centroids
+
+    index = get_scene_index(asset_id)
+    if not index.covers(start_date):
+        return None
+
+    series, found = read_series(db_session, parameter, start_date, end_date, cloud_cover)
+    scenes = index.query(start_date, end_date, cloud_cover)
+    missing = [(t, scene_id) for t, scene_id, _ in scenes if scene_id not in found]
+
+    if missing:
+        logging.info(f"Computing {parameter} means for {len(missing)} scene(s) not yet ingested")
+        means_rows = get_all_parameter_means_for_scenes(missing, asset_id)
+        for row in means_rows:
+            if row.get('Name') is not None and row.get('date') and row.get(parameter) is not None:
+                series.setdefault(str(row['Name']), []).append({'date': row['date'], 'value': row[parameter]})
+        try:
+            store_scene_means(db_session, means_rows, {scene_id: cloud for _, scene_id, cloud in scenes}, missing)
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logging.warning(f"Could not store computed scene means: {e}")
+
+    # Polygons without any value in the range are still listed
+    try:
+        for name, _, _ in get_polygon_centroids(asset_id):
+            series.setdefault(str(name), [])
+    except Exception as e:
+        logging.warning(f"Could not list asset polygons: {e}")
+
+    for values in series.values():
+        values.sort(key=lambda x: x['date']) # Sort by date
+    return series
@@ -0,0 +1,188 @@
+"""
+Client for the OpenWeatherMap 5-day / 3-hour forecast.
+
+Forecasts are fetched for the exact locations they are asked for. Callers that group
+many locations (the meteorological alert job, the batch route) snap them to a grid of
+WEATHER_GRID_DEG degrees first with snap_to_grid(), so nearby pens share one upstream
+call.
+
+Requests go through a pooled requests.Session with explicit timeouts. Forecasts are
+cached per location for WEATHER_CACHE_TTL_SECONDS, matching the provider's 3-hour
+update cadence. After that an entry is served stale for up to WEATHER_STALE_SECONDS
+while a single background refresh replaces it.
+"""
+
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from app.utils.lru_cache import LRUCache
+from app.utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# --- Configuration ---
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+OPENWEATHER_FORECAST_URL = os.getenv("OPENWEATHER_FORECAST_URL", "http://api.openweathermap.org/data/2.5/forecast")
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", 0.05))
+WEATHER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WEATHER_CONNECT_TIMEOUT_SECONDS", 3.05))
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", 10))
+WEATHER_MAX_CONCURRENCY = int(os.getenv("WEATHER_MAX_CONCURRENCY", 4))
+WEATHER_CACHE_TTL_SECONDS = int(os.getenv("WEATHER_CACHE_TTL_SECONDS", 3 * 60 * 60))
+WEATHER_STALE_SECONDS = int(os.getenv("WEATHER_STALE_SECONDS", 6 * 60 * 60))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", 1024))
+
+_cache = LRUCache(WEATHER_CACHE_MAX_ENTRIES) # location -> (fetched_at, forecast)
+_flight = SingleFlight()
+_session = None
+_session_lock = threading.Lock()
+_refresh_executor = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class WeatherError(Exception):
+    """Raised when the forecast can't be fetched; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 500, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+def snap_to_grid(lat: float, lon: float) -> tuple:
+    """Rounds a location to the nearest node of the WEATHER_GRID_DEG grid."""
+    return (
+        round(round(float(lat) / WEATHER_GRID_DEG) * WEATHER_GRID_DEG, 6),
+        round(round(float(lon) / WEATHER_GRID_DEG) * WEATHER_GRID_DEG, 6),
+    )
+
+def parse_forecast(data: dict) -> dict:
+    """Extracts the location name and the per-step values used by the app."""
+    forecast = []
+    for entry in data["list"]:
+        forecast.append({
+            "datetime": entry["dt_txt"],
+            "temperature": entry["main"]["temp"],  # °C
+            "humidity": entry["main"]["humidity"],  # %
+            "rainfall": entry.get("rain", {}).get("3h", 0),  # mm
+            "gust_speed": entry.get("wind", {}).get("gust", 0)  # m/s
+        })
+    return {"location": data["city"]["name"], "forecast": forecast}
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=WEATHER_MAX_CONCURRENCY * 2, max_retries=retries)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def _reset_after_fork():
+    # Pooled sockets and refresh threads don't survive a fork
+    global _session, _session_lock, _refresh_executor, _refreshing_lock
+    _session = None
+    _session_lock = threading.Lock()
+    _refresh_executor = None
+    _refreshing.clear()
+    _refreshing_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def fetch_forecast(lat: float, lon: float) -> dict:
+    """Fetches and parses the forecast for (lat, lon), bypassing the cache."""
+    if not OPENWEATHER_API_KEY:
+        raise WeatherError("Missing OpenWeatherMap API key")
+
+    params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    try:
+        response = get_session().get(
+            OPENWEATHER_FORECAST_URL, params=params,
+            timeout=(WEATHER_CONNECT_TIMEOUT_SECONDS, WEATHER_TIMEOUT_SECONDS)
+        )
+    except requests.RequestException as e:
+        raise WeatherError("Failed to fetch weather data", 502, str(e))
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = response.text
+    if response.status_code != 200:
+        raise WeatherError("Failed to fetch weather data", response.status_code, data)
+    return parse_forecast(data)
+
+def _cache_key(location: tuple) -> str:
+    return f"{location[0]:.6f},{location[1]:.6f}"
+
+def _fetch_and_store(location: tuple) -> dict:
+    forecast = fetch_forecast(*location)
+    _cache.set(_cache_key(location), (time.time(), forecast), WEATHER_CACHE_TTL_SECONDS + WEATHER_STALE_SECONDS)
+    return forecast
+
+def _refresh_in_background(location: tuple):
+    """Schedules one refresh of the location unless one is already running."""
+    global _refresh_executor
+    with _refreshing_lock:
+        if location in _refreshing:
+            return
+        _refreshing.add(location)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='weather-refresh')
+
+    def refresh():
+        try:
+            _flight.do(_cache_key(location), _fetch_and_store, location)
+        except Exception as e:
+            logging.warning(f"Background weather refresh failed for {location}, serving stale forecast: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(location)
+
+    _refresh_executor.submit(refresh)
+
+def get_forecast(lat: float, lon: float) -> dict:
+    """
+    Returns the forecast for (lat, lon) from the cache.
+    A stale entry is returned immediately while it is refreshed in the background;
+    concurrent misses for the same location share one upstream call.
+    """
+    location = (float(lat), float(lon))
+    entry = _cache.get(_cache_key(location))
+    if entry is not None:
+        fetched_at, forecast = entry
+        if time.time() - fetched_at >= WEATHER_CACHE_TTL_SECONDS:
+            _refresh_in_background(location)
+        return forecast
+    return _flight.do(_cache_key(location), _fetch_and_store, location)
+
+def fetch_forecasts(locations) -> dict:
+    """
+    Returns the forecast of every distinct (lat, lon) location, e.g. grid cells from
+    snap_to_grid(). Cache misses are fetched at most WEATHER_MAX_CONCURRENCY at a time.
+    Returns {location: forecast or WeatherError}.
+    """
+    locations = list(dict.fromkeys((float(lat), float(lon)) for lat, lon in locations))
+
+    def fetch(location):
+        try:
+            return get_forecast(*location)
+        except WeatherError as e:
+            logging.warning(f"Weather forecast unavailable for {location}: {e} ({e.details})")
+            return e
+
+    if len(locations) <= 1:
+        return {location: fetch(location) for location in locations}
+    with ThreadPoolExecutor(max_workers=min(WEATHER_MAX_CONCURRENCY, len(locations)), thread_name_prefix='weather') as executor:
+        return dict(zip(locations, executor.map(fetch, locations)))
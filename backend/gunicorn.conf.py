@@ -0,0 +1,21 @@
+"""
+Gunicorn hooks for the Earth Engine session.
+
+The master loads the service account credentials once before forking, and every
+worker initializes its Earth Engine session at boot instead of on its first request.
+"""
+
+def on_starting(server):
+    from app.utils.ee_session import ee_session
+    try:
+        ee_session.warm_up()
+    except Exception as e:
+        server.log.warning(f"Earth Engine credential warm-up failed: {e}")
+
+def post_fork(server, worker):
+    from app.utils.ee_session import ee_session
+    try:
+        ee_session.initialize()
+    except Exception as e:
+        # Workers still start; the session is retried lazily on the first EE call
+        server.log.warning(f"Earth Engine initialization failed in worker {worker.pid}: {e}")
@@ -0,0 +1,171 @@
+"""
+Benchmarks the user search query before and after the pg_trgm indexes.
+
+Seeds a scratch schema with synthetic users, times the search query without the
+trigram indexes (sequential scan) and with them, then drops the schema. Needs a
+database where pg_trgm can be created.
+
+Run script: (python tests/benchmark-user-search.py)
+"""
+
+import os
+import time
+import statistics
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+SCHEMA = "bench_user_search"
+USER_COUNT = int(os.getenv("BENCH_USER_COUNT", 100000))
+RUNS = 20
+SEARCH_TERMS = ["maria", "santos", "example.org", "0917", "zzq"]
+
+# Search as done before the trigram indexes: substring ILIKE, ordered by name
+BEFORE_QUERY = """
+    SELECT user_id, name, email FROM "User"
+    WHERE is_registered AND is_verified
+      AND (name ILIKE %(pattern)s OR email ILIKE %(pattern)s OR contact_no ILIKE %(pattern)s)
+    ORDER BY name, user_id
+    LIMIT 21
+"""
+
+# Search as done by the routes: same filter, ranked by trigram similarity
+AFTER_QUERY = """
+    SELECT user_id, name, email,
+           greatest(similarity(name, %(term)s), similarity(email, %(term)s), similarity(contact_no, %(term)s))::float8 AS score
+    FROM "User"
+    WHERE is_registered AND is_verified
+      AND (name ILIKE %(pattern)s OR email ILIKE %(pattern)s OR contact_no ILIKE %(pattern)s)
+    ORDER BY score DESC, user_id DESC
+    LIMIT 21
+"""
+
+# The next page of AFTER_QUERY, keyed on the (score, user_id) of the last row of the first
+AFTER_NEXT_PAGE_QUERY = """
+    SELECT * FROM (
+        SELECT user_id, name, email,
+               greatest(similarity(name, %(term)s), similarity(email, %(term)s), similarity(contact_no, %(term)s))::float8 AS score
+        FROM "User"
+        WHERE is_registered AND is_verified
+          AND (name ILIKE %(pattern)s OR email ILIKE %(pattern)s OR contact_no ILIKE %(pattern)s)
+    ) AS matches
+    WHERE (score, user_id) < (%(last_score)s, %(last_user_id)s)
+    ORDER BY score DESC, user_id DESC
+    LIMIT 21
+"""
+
+SEED_SQL = """
+    CREATE TABLE "User" (
+        user_id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        contact_no VARCHAR(15) NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        is_registered BOOLEAN NOT NULL DEFAULT FALSE,
+        is_verified BOOLEAN NOT NULL DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_user_email ON "User"(email);
+    CREATE INDEX idx_user_name_id ON "User"(name, user_id);
+
+    INSERT INTO "User" (name, email, contact_no, password, is_registered, is_verified, created_at)
+    SELECT
+        (ARRAY['Maria','Juan','Jose','Ana','Pedro','Rosa','Carlo','Liza','Mark','Grace'])[1 + (i / 3) %% 10]
+            || ' ' || (ARRAY['Santos','Reyes','Cruz','Bautista','Garcia','Mendoza','Torres','Ramos'])[1 + (i / 10) %% 8]
+            || ' ' || substr(md5(i::text), 1, 6),
+        'user' || i || '@' || (ARRAY['example.com','example.org','mail.ph'])[1 + i %% 3],
+        '09' || lpad((i * 7919 %% 1000000000)::text, 9, '0'),
+        'x',
+        i %% 5 <> 0,
+        i %% 7 <> 0,
+        now() - (i || ' minutes')::interval
+    FROM generate_series(1, %(count)s) AS i;
+"""
+
+TRGM_INDEX_SQL = """
+    CREATE INDEX idx_user_name_trgm ON "User" USING GIN (name gin_trgm_ops);
+    CREATE INDEX idx_user_email_trgm ON "User" USING GIN (email gin_trgm_ops);
+    CREATE INDEX idx_user_contact_no_trgm ON "User" USING GIN (contact_no gin_trgm_ops);
+"""
+
+def time_query(cursor, query, term, **extra):
+    """Returns the median and p95 latency (ms) of the query over RUNS executions."""
+    params = {"term": term, "pattern": f"%{term}%", **extra}
+    cursor.execute(query, params)  # Warm up
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def plan_of(cursor, query, term, **extra):
+    cursor.execute("EXPLAIN " + query, {"term": term, "pattern": f"%{term}%", **extra})
+    plan = [row[0] for row in cursor.fetchall()]
+    scans = [line.strip().lstrip("-> ") for line in plan if "Scan" in line]
+    return "; ".join(scans) if scans else plan[0].strip()
+
+def next_page_cursor(cursor, term):
+    """Returns the keyset cursor after the first page of AFTER_QUERY, or None without a second page."""
+    cursor.execute(AFTER_QUERY, {"term": term, "pattern": f"%{term}%"})
+    rows = cursor.fetchall()
+    if len(rows) <= 20:
+        return None
+    return {"last_score": rows[19][3], "last_user_id": rows[19][0]}
+
+def main():
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"SET search_path TO {SCHEMA}, public")
+
+        print(f"Seeding {USER_COUNT} synthetic users...")
+        cursor.execute(SEED_SQL, {"count": USER_COUNT})
+        cursor.execute('ANALYZE "User"')
+
+        before = {term: (time_query(cursor, BEFORE_QUERY, term), plan_of(cursor, BEFORE_QUERY, term)) for term in SEARCH_TERMS}
+
+        print("Creating trigram indexes...")
+        cursor.execute(TRGM_INDEX_SQL)
+        cursor.execute('ANALYZE "User"')
+
+        after = {term: (time_query(cursor, AFTER_QUERY, term), plan_of(cursor, AFTER_QUERY, term)) for term in SEARCH_TERMS}
+        next_page = {}
+        for term in SEARCH_TERMS:
+            last = next_page_cursor(cursor, term)
+            if last is not None:
+                next_page[term] = (time_query(cursor, AFTER_NEXT_PAGE_QUERY, term, **last), plan_of(cursor, AFTER_NEXT_PAGE_QUERY, term, **last))
+
+        print(f"\n{'term':<14}{'before p50/p95 (ms)':>22}{'after p50/p95 (ms)':>22}{'page 2 p50/p95 (ms)':>22}")
+        for term in SEARCH_TERMS:
+            (b50, b95), _ = before[term]
+            (a50, a95), _ = after[term]
+            page_2 = f"{next_page[term][0][0]:.1f} / {next_page[term][0][1]:.1f}" if term in next_page else "-"
+            print(f"{term:<14}{f'{b50:.1f} / {b95:.1f}':>22}{f'{a50:.1f} / {a95:.1f}':>22}{page_2:>22}")
+        print("\nPlans:")
+        for term in SEARCH_TERMS:
+            print(f"  {term}: before: {before[term][1]}")
+            print(f"  {' ' * len(term)}  after:  {after[term][1]}")
+            if term in next_page:
+                print(f"  {' ' * len(term)}  page 2: {next_page[term][1]}")
+    finally:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
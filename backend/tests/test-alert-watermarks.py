@@ -0,0 +1,98 @@
+"""
+Checks the watermark logic of the water quality alert job without Earth Engine or a
+database: which readings new_readings() evaluates and which watermarks it advances,
+and when has_new_scenes() lets a run skip the reduction.
+
+Run script: (python tests/test-alert-watermarks.py)
+"""
+
+import os
+import sys
+import tempfile
+
+# The alert job reads its configuration at import time
+os.environ.setdefault("BAYSENSE_CACHE_DIR", tempfile.mkdtemp(prefix="baysense-alerts-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import generate_water_quality_alerts as alerts
+from app.utils.scene_index import DAY_MS, date_to_ms, ms_to_date
+
+WATERMARK = date_to_ms("2025-03-10")
+RECHECK = 5 * DAY_MS
+KEY = ("FLA-1", "chlorophyll")
+
+
+def row(time_ms, value=1.0):
+    return {"Name": "FLA-1", "date": ms_to_date(time_ms), "time": time_ms, "chlorophyll": value}
+
+
+def check_new_readings():
+    alerts.PARAMETERS_TO_CHECK = ["chlorophyll"]
+    rows = [row(WATERMARK - 2 * DAY_MS), row(WATERMARK), row(WATERMARK + DAY_MS)]
+    watermarks = {KEY: WATERMARK}
+
+    # Without a re-check window only the scene after the watermark is evaluated
+    _, _, dates, _, advanced = alerts.new_readings(rows, watermarks, 0)
+    assert [d.strftime("%Y-%m-%d") for d in dates] == ["2025-03-11"]
+    assert advanced == {KEY: WATERMARK + DAY_MS}
+
+    # The re-check window re-evaluates the older scenes, but the watermark only moves forward
+    _, _, dates, _, advanced = alerts.new_readings(rows, watermarks, 0, RECHECK)
+    assert [d.strftime("%Y-%m-%d") for d in dates] == ["2025-03-08", "2025-03-10", "2025-03-11"]
+    assert advanced == {KEY: WATERMARK + DAY_MS}
+
+    # Re-checked scenes alone don't advance anything
+    _, _, dates, _, advanced = alerts.new_readings(rows[:2], watermarks, 0, RECHECK)
+    assert len(dates) == 2 and advanced == {}
+
+    # A masked scene after the watermark is not evaluated but still advances it
+    _, _, dates, _, advanced = alerts.new_readings([row(WATERMARK + DAY_MS, None)], watermarks, 0, RECHECK)
+    assert dates == [] and advanced == {KEY: WATERMARK + DAY_MS}
+
+    # FLAs without a watermark use the default
+    _, _, dates, _, advanced = alerts.new_readings(rows, {}, WATERMARK, 0)
+    assert len(dates) == 1 and advanced == {KEY: WATERMARK + DAY_MS}
+    print("new_readings: OK")
+
+
+class StandInIndex:
+    def __init__(self, scenes):
+        self.scenes = scenes
+
+    def query(self, start_date, end_date, cloud_cover=20):
+        lo, hi = date_to_ms(start_date), date_to_ms(end_date)
+        return [scene for scene in self.scenes if lo <= scene[0] < hi and scene[2] < cloud_cover]
+
+
+def check_has_new_scenes():
+    scenes = [(WATERMARK - 2 * DAY_MS, "S-old", 5.0), (WATERMARK, "S-watermark", 5.0)]
+    alerts.get_scene_index = lambda asset_id: StandInIndex(scenes)
+    end_date = "2025-03-20"
+
+    # First run: nothing seen yet
+    run, scene_ids = alerts.has_new_scenes(WATERMARK, WATERMARK - RECHECK, end_date, set())
+    assert run and scene_ids == ["S-old", "S-watermark"]
+
+    # Nothing new since the last run
+    run, _ = alerts.has_new_scenes(WATERMARK, WATERMARK - RECHECK, end_date, set(scene_ids))
+    assert not run
+
+    # A scene older than the watermark is ingested late
+    scenes.insert(0, (WATERMARK - 3 * DAY_MS, "S-late", 5.0))
+    run, _ = alerts.has_new_scenes(WATERMARK, WATERMARK - RECHECK, end_date, set(scene_ids))
+    assert run
+
+    # A scene newer than the watermark
+    scenes[:] = [(WATERMARK + DAY_MS, "S-new", 5.0)]
+    run, _ = alerts.has_new_scenes(WATERMARK, WATERMARK - RECHECK, end_date, {"S-new"})
+    assert run
+    print("has_new_scenes: OK")
+
+
+def main():
+    check_new_readings()
+    check_has_new_scenes()
+    print("All alert watermark checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Exercises the tile proxy against a local stand-in for the Earth Engine tile server.
+
+The stand-in serves small PNGs for /maps/<map_id>/tiles/{z}/{x}/{y} and rejects map
+IDs marked as expired, so the script checks disk cache hits, coalescing of concurrent
+misses, map ID rebuilding, LRU eviction and the /tiles route without Earth Engine.
+
+Run script: (python tests/test-tile-proxy.py)
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The proxy reads its configuration at import time
+CACHE_DIR = tempfile.mkdtemp(prefix="baysense-tiles-")
+os.environ["BAYSENSE_CACHE_DIR"] = CACHE_DIR
+os.environ["TILE_PROXY_MIN_MAP_AGE_SECONDS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from app.utils import tile_proxy
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 256
+
+
+class StandInTileServer(BaseHTTPRequestHandler):
+    requests = []
+    expired = set()
+    delay = 0
+
+    def do_GET(self):
+        StandInTileServer.requests.append(self.path)
+        time.sleep(StandInTileServer.delay)
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 6 or parts[0] != "maps" or parts[2] != "tiles" or parts[1] in StandInTileServer.expired:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_checks(base_url):
+    maps = {"current": "map1", "invalidated": 0}
+
+    tile_proxy.register_layer_kind(
+        "stand_in",
+        lambda args: f"{base_url}/maps/{maps['current']}/tiles/{{z}}/{{x}}/{{y}}",
+        lambda args: maps.update(current=f"map{int(maps['current'][3:]) + 1}", invalidated=maps["invalidated"] + 1)
+    )
+    layer_key = tile_proxy.register_layer("stand_in", parameter="chlorophyll", date="2025-01-01")
+    assert layer_key == tile_proxy.register_layer("stand_in", date="2025-01-01", parameter="chlorophyll")
+    print(f"Layer key: {layer_key}")
+
+    # Miss, then hit from disk
+    first_path = tile_proxy.get_tile(layer_key, 10, 868, 483)
+    assert open(first_path, "rb").read() == PNG and len(StandInTileServer.requests) == 1
+    assert tile_proxy.get_tile(layer_key, 10, 868, 483) == first_path and len(StandInTileServer.requests) == 1
+    print("Disk cache hit: OK")
+
+    # Concurrent misses share one upstream request
+    StandInTileServer.delay = 0.2
+    threads = [threading.Thread(target=tile_proxy.get_tile, args=(layer_key, 10, 869, 483)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    StandInTileServer.delay = 0
+    assert len(StandInTileServer.requests) == 2
+    print("Coalesced concurrent misses: OK")
+
+    # An expired map ID is rebuilt and the tile fetched from the new one
+    StandInTileServer.expired.add("map1")
+    tile_proxy._resolved.delete(layer_key)
+    path = tile_proxy.get_tile(layer_key, 10, 870, 483)
+    # Tiles of the new map ID live in a separate generation directory
+    assert maps["invalidated"] == 1 and os.path.exists(path)
+    assert path.split(os.sep)[-4] != first_path.split(os.sep)[-4]
+    assert StandInTileServer.requests[-1].startswith("/maps/map2/")
+    print("Expired map ID rebuilt: OK")
+
+    # Unknown layers and out-of-range tiles
+    for args in (("0" * 32, 10, 1, 1), ("not-a-key", 10, 1, 1), (layer_key, 3, 8, 0)):
+        try:
+            tile_proxy.get_tile(*args)
+            raise AssertionError(f"Expected a 404 for {args}")
+        except tile_proxy.TileProxyError as e:
+            assert e.status_code == 404
+    print("Unknown layer / out of range: OK")
+
+    # LRU eviction keeps the most recently used tiles
+    paths = [tile_proxy.get_tile(layer_key, 12, x, 1934) for x in range(3472, 3482)]
+    for i, path in enumerate(paths):
+        os.utime(path, (time.time() - 1000 + i, time.time() - 1000 + i))
+    result = tile_proxy.sweep_disk_cache(max_bytes=len(PNG) * 6)
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[-1])
+    print(f"LRU eviction: OK ({result})")
+
+    # The route serves the cached file
+    from app.routes.get_tile import tile_routes
+    app = Flask(__name__)
+    app.register_blueprint(tile_routes)
+    client = app.test_client()
+    response = client.get(f"/tiles/{layer_key}/10/868/483.png")
+    assert response.status_code == 200 and response.mimetype == "image/png" and response.data == PNG
+    etag = response.headers["ETag"]
+    response.close()
+    assert client.get(f"/tiles/{layer_key}/10/868/483.png", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/tiles/{'f' * 32}/10/868/483.png").status_code == 404
+    print("Route: OK")
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInTileServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        run_checks(f"http://127.0.0.1:{server.server_address[1]}")
+        print("All tile proxy checks passed.")
+    finally:
+        server.shutdown()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
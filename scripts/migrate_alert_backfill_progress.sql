@@ -0,0 +1,8 @@
+-- Adds backfill progress tracking to an existing database created with setup.sql.
+CREATE TABLE IF NOT EXISTS "AlertBackfillProgress" (
+    shard_start DATE NOT NULL,
+    shard_end DATE NOT NULL, -- exclusive
+    alerts_inserted INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (shard_start, shard_end)
+);
@@ -0,0 +1,9 @@
+-- Adds the alert job's scene watermarks to an existing database created with setup.sql.
+-- With no rows, the next run falls back to its 14-day lookback window.
+CREATE TABLE IF NOT EXISTS "AlertWatermarks" (
+    fla VARCHAR(20) NOT NULL,
+    parameter VARCHAR(20) NOT NULL,
+    last_scene_time TIMESTAMP NOT NULL, -- acquisition time (UTC)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fla, parameter)
+);
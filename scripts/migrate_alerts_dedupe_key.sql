@@ -0,0 +1,8 @@
+-- Adds the structured alert dedupe key to an existing database created with setup.sql.
+-- Existing alerts keep a NULL parameter, which never conflicts with new alerts.
+ALTER TABLE "Alerts" ADD COLUMN IF NOT EXISTS parameter VARCHAR(20);
+ALTER TABLE "Alerts" ADD COLUMN IF NOT EXISTS observation_date DATE;
+
+UPDATE "Alerts" SET observation_date = datetime::date WHERE observation_date IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_alerts_dedupe ON "Alerts"(fla, parameter, observation_date);
@@ -0,0 +1,14 @@
+-- Adds the materialized parameter time series to an existing database created with setup.sql.
+CREATE TABLE IF NOT EXISTS "ParameterTimeSeries" (
+    fla VARCHAR(20) NOT NULL,
+    scene_id VARCHAR(64) NOT NULL, -- Sentinel-2 system:index
+    scene_time TIMESTAMP NOT NULL, -- acquisition time (UTC)
+    observation_date DATE NOT NULL,
+    cloud_cover FLOAT NOT NULL, -- scene CLOUDY_PIXEL_PERCENTAGE
+    chlorophyll FLOAT, -- polygon means, NULL where the polygon is masked
+    turbidity FLOAT,
+    tss FLOAT,
+    ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fla, scene_id)
+);
+CREATE INDEX IF NOT EXISTS idx_parameter_time_series_scene_time ON "ParameterTimeSeries"(scene_time, cloud_cover);
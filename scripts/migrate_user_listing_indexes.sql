@@ -0,0 +1,3 @@
+-- Adds the sort-key indexes of the keyset-paginated user listings to an existing database.
+CREATE INDEX IF NOT EXISTS idx_user_name_id ON "User"(name, user_id);
+CREATE INDEX IF NOT EXISTS idx_user_created_id ON "User"(created_at, user_id);
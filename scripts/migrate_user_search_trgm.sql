@@ -0,0 +1,6 @@
+-- Adds trigram search indexes on users to an existing database created with setup.sql.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_user_name_trgm ON "User" USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_user_email_trgm ON "User" USING GIN (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_user_contact_no_trgm ON "User" USING GIN (contact_no gin_trgm_ops);
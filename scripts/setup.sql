@@ -1,3 +1,6 @@
+-- Trigram matching for indexed substring search on users
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Create ENUM types
 CREATE TYPE alert_status AS ENUM ('pending', 'dismissed', 'resolved');
 CREATE TYPE cage_status AS ENUM ('good', 'at risk');
@@ -19,6 +22,15 @@ CREATE TABLE "User" (
 -- Index on email for faster lookups
 CREATE INDEX idx_user_email ON "User"(email);
 
+-- Sort keys of the keyset-paginated user listings
+CREATE INDEX idx_user_name_id ON "User"(name, user_id);
+CREATE INDEX idx_user_created_id ON "User"(created_at, user_id);
+
+-- Trigram indexes for ILIKE '%term%' search and similarity ranking
+CREATE INDEX idx_user_name_trgm ON "User" USING GIN (name gin_trgm_ops);
+CREATE INDEX idx_user_email_trgm ON "User" USING GIN (email gin_trgm_ops);
+CREATE INDEX idx_user_contact_no_trgm ON "User" USING GIN (contact_no gin_trgm_ops);
+
 -- Table: Admin
 CREATE TABLE "Admin" (
     admin_id SERIAL PRIMARY KEY,
@@ -35,6 +47,8 @@ CREATE TABLE "Alerts" (
     alert_type alert_type NOT NULL,
     alert_message TEXT NOT NULL,
     datetime TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    parameter VARCHAR(20), -- e.g. 'chlorophyll', 'gust_speed'
+    observation_date DATE, -- date of the observation/forecast that triggered the alert
     status alert_status NOT NULL DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -43,6 +57,45 @@ CREATE TABLE "Alerts" (
 -- Index on cage_id and datetime for faster lookups
 CREATE INDEX idx_alerts_datetime ON "Alerts"(datetime);
 
+-- One alert per FLA, parameter and observation date (target of INSERT ... ON CONFLICT DO NOTHING)
+CREATE UNIQUE INDEX uq_alerts_dedupe ON "Alerts"(fla, parameter, observation_date);
+
+-- Table: AlertWatermarks
+-- Last Sentinel-2 scene processed by the alert job, per FLA and parameter
+CREATE TABLE "AlertWatermarks" (
+    fla VARCHAR(20) NOT NULL,
+    parameter VARCHAR(20) NOT NULL,
+    last_scene_time TIMESTAMP NOT NULL, -- acquisition time (UTC)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fla, parameter)
+);
+
+-- Table: AlertBackfillProgress
+-- Completed shards of a historical alert backfill, committed with the shard's alerts
+CREATE TABLE "AlertBackfillProgress" (
+    shard_start DATE NOT NULL,
+    shard_end DATE NOT NULL, -- exclusive
+    alerts_inserted INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (shard_start, shard_end)
+);
+
+-- Table: ParameterTimeSeries
+-- Per-FLA, per-scene means of the water quality parameters, filled by the ingestion job
+CREATE TABLE "ParameterTimeSeries" (
+    fla VARCHAR(20) NOT NULL,
+    scene_id VARCHAR(64) NOT NULL, -- Sentinel-2 system:index
+    scene_time TIMESTAMP NOT NULL, -- acquisition time (UTC)
+    observation_date DATE NOT NULL,
+    cloud_cover FLOAT NOT NULL, -- scene CLOUDY_PIXEL_PERCENTAGE
+    chlorophyll FLOAT, -- polygon means, NULL where the polygon is masked
+    turbidity FLOAT,
+    tss FLOAT,
+    ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fla, scene_id)
+);
+CREATE INDEX idx_parameter_time_series_scene_time ON "ParameterTimeSeries"(scene_time, cloud_cover);
+
 -- Table: ParameterThresholds
 CREATE TABLE "ParameterThresholds" (
     threshold_id SERIAL PRIMARY KEY,